@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_sources import REPO_ROOT, parse_neighborhoods
+from get_neighborhood import parse_points
+from instrumentation import span
+from optimization import PREP_PARAMS, preprocess, select_candidates, solve_numpy
+from rent_zones import zone_index
+from traffic import canonicalize_columns
+
+BASELINE_FILE = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+
+# NYC extent used for synthetic points and zones
+LAT_RANGE = (40.55, 40.92)
+LON_RANGE = (-74.10, -73.72)
+
+BOROUGHS = ['Manhattan', 'Brooklyn', 'Queens', 'Bronx', 'Staten Island']
+# Libraries the data and report commands should not load at startup
+HEAVY_MODULES = ['gurobipy', 'folium', 'shapely', 'requests', 'scipy', 'matplotlib']
+COLD_START_COMMANDS = {
+    'data': ['data', '--offline', '--top', '1'],
+    'rank': ['rank', '--offline', '--backend', 'numpy', '--top', '1'],
+}
+
+STAGES = ['parse_points', 'assign_rent', 'prepare_data', 'build_model', 'solve', 'create_map']
+# Stages timed on whichever solver _solve_stage ended up using
+SOLVER_STAGES = ['build_model', 'solve']
+
+
+def survey_labels(n_surveys):
+    '''
+    May07, Sept07, May08, ... like the real survey columns
+    '''
+    return [f"{'May' if i % 2 == 0 else 'Sept'}{7 + i // 2:02d}" for i in range(n_surveys)]
+
+
+def synthetic_counts_csv(path, n_locations, n_surveys=12, seed=0, missing_rate=0.0005,
+                         chunk_size=100_000):
+    '''
+    writes a pedestrian count CSV shaped like the NYC DOT file: one row per
+    location, a POINT geometry and AM/PM/MD counts per survey. rows are
+    generated and written chunk_size at a time
+    '''
+    rng = np.random.default_rng(seed)
+    surveys = survey_labels(n_surveys)
+    for start in range(0, n_locations, chunk_size):
+        n = min(chunk_size, n_locations - start)
+        lat = rng.uniform(*LAT_RANGE, n)
+        lon = rng.uniform(*LON_RANGE, n)
+        ids = np.arange(start + 1, start + n + 1)
+        columns = {
+            'the_geom': [f"POINT ({x:.14f} {y:.14f})" for x, y in zip(lon, lat)],
+            'OBJECTID': ids,
+            'Loc': ids,
+            'Borough': rng.choice(BOROUGHS, n),
+            'Street_Nam': 'Broadway',
+            'From_Stree': 'West 1st Street',
+            'To_Street': 'West 2nd Street',
+            'Iex': 'N',
+        }
+        # each location has a base level, each period its own share of it
+        base = rng.lognormal(np.log(3000), 0.8, n)
+        for survey in surveys:
+            for period, share in [('AM', 0.25), ('PM', 0.45), ('MD', 0.30)]:
+                counts = np.round(base * share * rng.lognormal(0, 0.25, n))
+                counts[rng.random(n) < missing_rate] = np.nan
+                columns[f'{survey}_{period}'] = counts
+        pd.DataFrame(columns).to_csv(path, mode='w' if start == 0 else 'a',
+                                     header=start == 0, index=False)
+    return path
+
+
+def synthetic_zones_text(n_zones, seed=0):
+    '''
+    neighborhoods JSON with n_zones bounding boxes on a jittered grid over
+    the city, slightly overlapping like the hand-drawn ones
+    '''
+    rng = np.random.default_rng(seed)
+    cols = int(np.ceil(np.sqrt(n_zones)))
+    rows = int(np.ceil(n_zones / cols))
+    lat_step = (LAT_RANGE[1] - LAT_RANGE[0]) / rows
+    lon_step = (LON_RANGE[1] - LON_RANGE[0]) / cols
+    zones = {}
+    for z in range(n_zones):
+        r, c = divmod(z, cols)
+        pad = rng.uniform(-0.1, 0.15, 4)
+        zones[f"Zone {z}"] = {
+            'lat_min': round(LAT_RANGE[0] + (r - pad[0]) * lat_step, 4),
+            'lat_max': round(LAT_RANGE[0] + (r + 1 + pad[1]) * lat_step, 4),
+            'lon_min': round(LON_RANGE[0] + (c - pad[2]) * lon_step, 4),
+            'lon_max': round(LON_RANGE[0] + (c + 1 + pad[3]) * lon_step, 4),
+            'rent': round(float(rng.uniform(35, 200)), 2),
+        }
+    return json.dumps(zones, indent=4)
+
+
+def _solve_stage(candidate_locs, day, results):
+    '''
+    Gurobi build and solve when gurobipy and a licence for the model size
+    are available, the NumPy solver as a local stand-in otherwise
+    '''
+    try:
+        import gurobipy as gp
+        from optimization import build_gurobi_model
+    except ImportError:
+        gp = None
+    try:
+        if gp is None:
+            raise ImportError("gurobipy is not installed")
+        with span('build_model') as build:
+            model, x, y = build_gurobi_model(candidate_locs, day)
+            model.Params.OutputFlag = 0
+            model.update()
+        with span('solve') as solve:
+            model.optimize()
+        results['solver'] = 'gurobi'
+        return {'build_model': build['duration'], 'solve': solve['duration']}
+    except (ImportError, gp.GurobiError if gp else ImportError) as e:
+        results['solver'] = f'numpy ({type(e).__name__})'
+        with span('solve') as solve:
+            solve_numpy(candidate_locs, day)
+        return {'solve': solve['duration']}
+
+
+def run_scale(n_locations, n_surveys=12, n_zones=100, seed=0, map_limit=100_000):
+    '''
+    times each pipeline stage on one synthetic data set
+    '''
+    neighborhoods = parse_neighborhoods(synthetic_zones_text(n_zones, seed))
+    with tempfile.TemporaryDirectory() as tmp:
+        counts_file = synthetic_counts_csv(os.path.join(tmp, 'counts.csv'), n_locations, n_surveys, seed)
+        # copy() consolidates the one-block-per-column frame read_csv returns
+        df = canonicalize_columns(pd.read_csv(counts_file)).copy()
+    results = {'locations': n_locations, 'surveys': n_surveys, 'zones': n_zones, 'stages': {}}
+    stages = results['stages']
+
+    with span('parse_points') as s:
+        df['latitude'], df['longitude'] = parse_points(df['the_geom'])
+    stages['parse_points'] = s['duration']
+
+    with span('assign_rent') as s:
+        df['rent_per_sqft'] = zone_index(neighborhoods).rents(df['latitude'], df['longitude'])
+    stages['assign_rent'] = s['duration']
+
+    with span('prepare_data') as s:
+        prepared = preprocess(df, **PREP_PARAMS)
+    stages['prepare_data'] = s['duration']
+
+    day = survey_labels(n_surveys)[0]
+    candidate_locs = select_candidates(prepared, day)
+    stages.update(_solve_stage(candidate_locs, day, results))
+
+    if n_locations <= map_limit:
+        try:
+            from map import create_map
+        except ImportError as e:
+            # like the Gurobi stage: the run goes on without the library
+            results['skipped'] = {'create_map': f"{e.name} is not installed"}
+            print(f"create_map skipped at {n_locations:,} sites: {e.name} is not installed")
+            return results
+        with tempfile.TemporaryDirectory() as tmp:
+            with span('create_map') as s:
+                create_map(prepared, set(), output_file=os.path.join(tmp, 'map.html'), mode='cluster')
+        stages['create_map'] = s['duration']
+    return results
+
+
+def cold_start(commands=None, repeats=3):
+    '''
+    wall time of fresh `python cli.py ...` processes (best of repeats) and
+    the heavy libraries each one imported. the feature store is warmed by
+    the untimed import trace, so this is startup plus a memory-mapped load
+    '''
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+    startup = {}
+    for name, argv in (commands or COLD_START_COMMANDS).items():
+        cmd = [sys.executable, cli] + argv
+        # -X importtime lists every import on stderr as "... |   <module>"
+        trace = subprocess.run([sys.executable, '-X', 'importtime', cli] + argv,
+                               capture_output=True, text=True, check=True)
+        imported = {line.rsplit('|', 1)[1].strip() for line in trace.stderr.splitlines()
+                    if line.startswith('import time:')}
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(cmd, capture_output=True, check=True)
+            times.append(time.perf_counter() - start)
+        startup[name] = {'seconds': min(times), 'heavy_modules': [m for m in HEAVY_MODULES if m in imported]}
+    return startup
+
+
+def workload(result):
+    '''
+    what a run measured: (locations, surveys, zones). results are only
+    compared with a baseline of the same workload
+    '''
+    return result['locations'], result['surveys'], result['zones']
+
+
+def solver_name(result):
+    '''
+    the solver a run's solver stages timed, without the reason for a
+    fallback: 'numpy (GurobiError)' -> 'numpy'
+    '''
+    return result.get('solver', '').split(' ', 1)[0]
+
+
+def compare(results, baseline, threshold=0.5, min_seconds=0.05):
+    '''
+    stages slower than baseline by more than threshold (a fraction) and by
+    more than min_seconds, as a list of messages. results without a
+    baseline for the same workload are skipped, and so are the solver
+    stages of results solved by another solver than the baseline
+    '''
+    known = {workload(r): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        matched = known.get(workload(result), {})
+        base = matched.get('stages', {})
+        same_solver = solver_name(result) == solver_name(matched)
+        for stage, duration in result['stages'].items():
+            if stage not in base or (stage in SOLVER_STAGES and not same_solver):
+                continue
+            limit = max(base[stage] * (1 + threshold), base[stage] + min_seconds)
+            if duration > limit:
+                regressions.append(f"{result['locations']:>9,} sites x {result['surveys']} surveys, "
+                                   f"{result['zones']} zones  {stage:<13} "
+                                   f"{duration:.3f}s vs baseline {base[stage]:.3f}s")
+    return regressions
+
+
+def compare_cold_start(startup, baseline, threshold=0.5, min_seconds=0.05):
+    '''
+    cold start regressions: slower commands, and heavy libraries a command
+    did not import in the baseline
+    '''
+    known = baseline.get('cold_start', {})
+    regressions = []
+    for name, result in startup.items():
+        if name not in known:
+            continue
+        base = known[name]
+        limit = max(base['seconds'] * (1 + threshold), base['seconds'] + min_seconds)
+        if result['seconds'] > limit:
+            regressions.append(f"cold start {name:<8} {result['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        added = sorted(set(result['heavy_modules']) - set(base['heavy_modules']))
+        if added:
+            regressions.append(f"cold start {name:<8} now imports {', '.join(added)}")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'sites':>9}  " + ''.join(f"{stage:>13}" for stage in STAGES) + "  solver")
+    for result in results:
+        cells = ''.join(f"{result['stages'][s]:>12.3f}s" if s in result['stages'] else f"{'-':>13}"
+                        for s in STAGES)
+        print(f"{result['locations']:>9,}  {cells}  {result.get('solver', '')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic NYC-like data")
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1_000, 10_000, 100_000, 1_000_000],
+                        help="numbers of candidate sites to generate")
+    parser.add_argument('--surveys', type=int, default=12, help="surveys per location (the real file has 36)")
+    parser.add_argument('--zones', type=int, default=100, help="rent zones")
+    parser.add_argument('--map-limit', type=int, default=100_000,
+                        help="skip create_map above this many sites")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help="allowed slowdown per stage as a fraction of the baseline")
+    parser.add_argument('--skip-cold-start', action='store_true',
+                        help="do not time CLI startup")
+    parser.add_argument('--output', default=None, help="also write this run's results as JSON")
+    args = parser.parse_args()
+
+    results = [run_scale(n, args.surveys, args.zones, map_limit=args.map_limit) for n in args.scales]
+    print_table(results)
+    run = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    if not args.skip_cold_start:
+        run['cold_start'] = cold_start()
+        print()
+        for name, result in run['cold_start'].items():
+            heavy = ', '.join(result['heavy_modules']) or 'none'
+            print(f"cold start {name:<8} {result['seconds']:.3f}s  heavy imports: {heavy}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        unmatched = {workload(r) for r in results} - {workload(r) for r in baseline.get('results', [])}
+        for n_locations, n_surveys, n_zones in sorted(unmatched):
+            print(f"\nNo baseline for {n_locations:,} sites x {n_surveys} surveys, {n_zones} zones, not compared")
+        solvers = {workload(r): solver_name(r) for r in baseline.get('results', [])}
+        for result in results:
+            if workload(result) in solvers and solvers[workload(result)] != solver_name(result):
+                print(f"\n{result['locations']:,} sites solved with {solver_name(result)}, the baseline "
+                      f"with {solvers[workload(result)]}: solver stages not compared")
+        regressions = compare(results, baseline, args.threshold) \
+            + compare_cold_start(run.get('cold_start', {}), baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            print('\n'.join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+    else:
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline to create one")
@@ -0,0 +1,255 @@
+import argparse
+import importlib
+import sys
+
+from instrumentation import add_profile_arguments, start_profiling, finish_profiling
+
+# Only the standard library is imported up front. Each command imports what
+# it needs when it runs, so `data` and `rank` never load folium, and nothing
+# loads gurobipy unless the gurobi backend is picked
+
+
+def load_data(args):
+    from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL
+    from optimization import prepare_data
+    if args.counts:
+        from ingest import prepare_streamed
+        return prepare_streamed(args.counts, NEIGHBORHOODS_URL, offline=args.offline,
+                                rent_fallback=args.rent_fallback)
+    return prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline,
+                        rent_fallback=args.rent_fallback)
+
+
+def solver_backend(args):
+    '''
+    the --backend name checked against optimization.SOLVERS, which holds
+    the built-in backends and any registered by --plugin modules
+    '''
+    from optimization import SOLVERS, default_backend
+
+    backend = args.backend or default_backend()
+    if backend not in SOLVERS:
+        sys.exit(f"unknown backend {backend!r}, expected one of: {', '.join(sorted(SOLVERS))}")
+    return backend
+
+
+def data_command(args):
+    '''
+    loads (or memory-maps) the preprocessed data and prints the busiest
+    locations
+    '''
+    from traffic import traffic_cube
+
+    df = load_data(args)
+    cube = traffic_cube(df)
+    print(f"{len(df)} rows, {len(cube.locations)} locations, {len(cube.surveys)} surveys "
+          f"({cube.surveys[0]} to {cube.surveys[-1]})")
+    avg = df.groupby('Loc')['daily_avg'].mean().sort_values(ascending=False)
+    print(f"\nTop {args.top} locations by average daily pedestrians:\n")
+    for loc, value in avg.head(args.top).items():
+        print(f"Location {loc}: {value:.2f} pedestrians/day")
+
+
+def rank_command(args):
+    '''
+    solves one survey day and prints the profitable locations
+    '''
+    from optimization import optimize_coffee_shops
+
+    results = optimize_coffee_shops(load_data(args), day=args.day, backend=solver_backend(args),
+                                    shop_size=args.shop_size)
+    if results is None:
+        print("No optimal solution found.")
+        return
+    print(results[['Location', 'Rent ($/sqft monthly)', 'Daily Profit', 'Operating Times',
+                   'Daily Customers']].head(args.top).to_string(index=False))
+    print(f"\n{len(results)} locations clear the profit floor")
+
+
+def map_command(args):
+    '''
+    solves one survey day and renders the locations with the chosen renderer
+    '''
+    from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL
+    from get_neighborhood import get_neighborhoods
+    from optimization import optimize_coffee_shops
+    from rendering import RENDERERS, render
+
+    if args.renderer not in RENDERERS:
+        sys.exit(f"unknown renderer {args.renderer!r}, expected one of: {', '.join(sorted(RENDERERS))}")
+    results = optimize_coffee_shops(load_data(args), day=args.day, backend=solver_backend(args))
+    if results is None:
+        print("No optimal solution found.")
+        return
+    if args.counts:
+        from ingest import streamed_locations
+        locations = streamed_locations(args.counts, NEIGHBORHOODS_URL, offline=args.offline,
+                                       rent_fallback=args.rent_fallback)
+    else:
+        locations = get_neighborhoods(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline,
+                                      rent_fallback=args.rent_fallback)
+    options = {'mode': args.mode} if args.renderer == 'folium' else {}
+    render(args.renderer, locations, results, args.output, **options)
+
+
+def sweep_command(args):
+    '''
+    best locations across survey days and shop sizes
+    '''
+    from scenarios import sweep_scenarios
+
+    results = sweep_scenarios(load_data(args), shop_sizes=args.shop_sizes, processes=args.processes)
+    print(results[results['Rank'] <= args.top].to_string(index=False))
+
+
+def robust_command(args):
+    '''
+    shop portfolio with the best worst-case profit over the survey periods
+    '''
+    from robust import robust_portfolio
+
+    result = robust_portfolio(load_data(args), k=args.k, rent_budget=args.rent_budget)
+    if result is None:
+        print("No feasible portfolio, try a larger --rent-budget")
+        return
+    selected, summary = result
+    print(selected.to_string(index=False))
+    print(f"\nWorst Case Daily Profit (Maximin): ${summary['worst_case_profit']:,.2f} "
+          f"in {summary['worst_scenario']}")
+
+
+def staff_command(args):
+    '''
+    hourly opening and staffing plan per location
+    '''
+    from staffing import optimize_staffing
+
+    results, schedule = optimize_staffing(load_data(args), args.day, max_staff=args.max_staff,
+                                          throughput=args.throughput, processes=args.processes)
+    print(results.head(args.top).to_string(index=False))
+    print("\nStaff per hour:\n")
+    print(schedule.head(args.top).to_string())
+
+
+def formats_command(args):
+    '''
+    shop formats per location under a budget
+    '''
+    from formats import select_formats
+
+    selected, summary = select_formats(load_data(args), args.budget, args.day, max_shops=args.max_shops,
+                                       build_out_per_sqft=args.build_out, rent_months=args.rent_months,
+                                       budget_unit=args.budget_unit, method=args.method)
+    print(selected.to_string(index=False))
+    print(f"\nSpent ${summary['spent']:,.2f} of ${args.budget:,.2f}")
+
+
+def serve_command(args):
+    '''
+    local HTTP service scoring ad-hoc lat/lon points
+    '''
+    from scoring import load_scorer, serve
+
+    scorer = load_scorer(args.offline, args.day, args.k, rent_fallback=args.rent_fallback, counts=args.counts,
+                         max_distance=args.max_distance, shop_size=args.shop_size)
+    serve(scorer, args.host, args.port)
+
+
+def _rank_arguments(parser):
+    parser.add_argument('--day', default='May07', help="survey day, e.g. May07")
+    parser.add_argument('--backend', default=None,
+                        help="solver: gurobi, numpy or one registered by a --plugin module "
+                             "(default: gurobi when installed, numpy otherwise)")
+
+
+def _top_argument(parser, default=10):
+    parser.add_argument('--top', type=int, default=default, help="rows to print")
+
+
+# name -> (help, run, add_arguments)
+COMMANDS = {
+    'data': ("load the data and print the busiest locations", data_command,
+             lambda p: _top_argument(p)),
+    'rank': ("rank profitable locations for one survey day", rank_command,
+             lambda p: (_rank_arguments(p), _top_argument(p, 20),
+                        p.add_argument('--shop-size', type=float, default=1000, help="sqft"))),
+    'map': ("render the locations map", map_command,
+            lambda p: (_rank_arguments(p),
+                       p.add_argument('--renderer', default='folium',
+                                      help="folium, geojson or one registered by a --plugin module"),
+                       p.add_argument('--mode', choices=['markers', 'cluster'], default='markers',
+                                      help="folium marker layout"),
+                       p.add_argument('--output', default=None,
+                                      help="output file (default depends on the renderer)"))),
+    'sweep': ("sweep survey days and shop sizes", sweep_command,
+              lambda p: (_top_argument(p, 3),
+                         p.add_argument('--shop-sizes', type=float, nargs='+', default=[600, 800, 1000]),
+                         p.add_argument('--processes', type=int, default=None))),
+    'robust': ("max-min shop portfolio over the survey periods", robust_command,
+               lambda p: (p.add_argument('-k', type=int, default=10, help="maximum number of shops"),
+                          p.add_argument('--rent-budget', type=float, default=None,
+                                         help="combined daily rent cap ($)"))),
+    'staff': ("hourly opening and staffing plan per location", staff_command,
+              lambda p: (p.add_argument('--day', default='May07', help="survey day, e.g. May07"),
+                         _top_argument(p),
+                         p.add_argument('--max-staff', type=int, default=6),
+                         p.add_argument('--throughput', type=float, default=30,
+                                        help="customers per staff member per hour"),
+                         p.add_argument('--processes', type=int, default=None))),
+    'formats': ("shop formats per location under a budget", formats_command,
+                lambda p: (p.add_argument('--day', default='May07', help="survey day, e.g. May07"),
+                           p.add_argument('--budget', type=float, required=True,
+                                          help="total of size x (build-out + rent months x monthly rent), $"),
+                           p.add_argument('--max-shops', type=int, default=None),
+                           p.add_argument('--build-out', type=float, default=0.0, help="$/sqft"),
+                           p.add_argument('--rent-months', type=float, default=1),
+                           p.add_argument('--budget-unit', type=float, default=None,
+                                          help="DP budget granularity, $"),
+                           p.add_argument('--method', choices=['gurobi', 'dp', 'greedy'], default=None,
+                                          help="default: gurobi when installed, dp otherwise"))),
+    'serve': ("serve single and batch site scoring over HTTP", serve_command,
+              lambda p: (p.add_argument('--day', default='May07', help="survey day, e.g. May07"),
+                         p.add_argument('-k', type=int, default=1,
+                                        help="counting sites to interpolate traffic from"),
+                         p.add_argument('--max-distance', type=float, default=3000,
+                                        help="metres; points further from every counting site are rejected"),
+                         p.add_argument('--shop-size', type=float, default=1000,
+                                        help="default sqft, requests may override"),
+                         p.add_argument('--host', default='127.0.0.1'),
+                         p.add_argument('--port', type=int, default=8080))),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Coffee shop location optimization")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, (help_text, run, add_arguments) in COMMANDS.items():
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument('--offline', action='store_true',
+                         help="read the local data files instead of downloading the gists")
+        sub.add_argument('--rent-fallback', choices=['nearest', 'idw'], default=None,
+                         help="give sites outside every rent zone the rent of the nearest zone(s)")
+        sub.add_argument('--counts', default=None, metavar='CSV',
+                         help="stream counts from this csv (bi-annual or hourly layout), "
+                              "reading only rows appended since the last run")
+        sub.add_argument('--plugin', action='append', default=[], metavar='MODULE',
+                         help="import MODULE first, e.g. one calling register_solver or register_renderer")
+        add_profile_arguments(sub)
+        add_arguments(sub)
+        sub.set_defaults(run=run)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    for module in args.plugin:
+        importlib.import_module(module)
+    start_profiling(args)
+    try:
+        args.run(args)
+    finally:
+        finish_profiling(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PEDESTRIAN_URL = "https://gist.githubusercontent.com/JoshBong/d83569f9837962d98b2c16d2312ed2d2/raw"
+NEIGHBORHOODS_URL = "https://gist.githubusercontent.com/JoshBong/5e6697ffa29f3db776254188a5aea8fb/raw/6621a3cf7fcde270097be79a1b5fe5c5716ae618/gistfile1.txt"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(REPO_ROOT, '.cache', 'sources')
+
+# Local copies used in offline mode
+PEDESTRIAN_FILE = os.path.join(REPO_ROOT, 'data', 'Bi-Annual_Pedestrian_Counts_20250423.csv')
+NEIGHBORHOODS_FILE = os.path.join(REPO_ROOT, 'src', 'neighborhoods.txt')
+
+# Cached copies younger than this are used without revalidating
+MAX_AGE = 60 * 60  # seconds
+
+_session = None
+_memo = {}
+
+
+def get_session():
+    """One pooled session shared by every download"""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        _session.mount('https://', adapter)
+        _session.mount('http://', adapter)
+    return _session
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def _write(path, text):
+    # write then rename so a crashed run never leaves a half-written cache file
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def fetch_text(url, cache_dir=CACHE_DIR, max_age=MAX_AGE, session=None):
+    '''
+    downloads url through an on-disk cache
+
+    the cache keeps one metadata file per url (ETag, Last-Modified and the
+    content hash) and stores bodies by content hash. stale entries are
+    revalidated with If-None-Match / If-Modified-Since, and the cached body
+    is used when the server answers 304 or cannot be reached
+    '''
+    if url in _memo:
+        return _memo[url]
+    import requests
+
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, hashlib.sha256(url.encode()).hexdigest() + '.json')
+    meta = json.loads(_read(meta_path)) if os.path.exists(meta_path) else None
+    body_path = os.path.join(cache_dir, meta['sha256'] + '.txt') if meta else None
+    cached = meta is not None and os.path.exists(body_path)
+
+    if cached and time.time() - meta['fetched_at'] < max_age:
+        text = _read(body_path)
+        _memo[url] = text
+        return text
+
+    headers = {}
+    if cached:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = (session or get_session()).get(url, headers=headers, timeout=30)
+        if response.status_code != 304:
+            response.raise_for_status()
+    except requests.RequestException:
+        if not cached:
+            raise
+        print(f"Could not reach {url}, using cached copy")
+        text = _read(body_path)
+        _memo[url] = text
+        return text
+
+    if response.status_code == 304:
+        text = _read(body_path)
+    else:
+        text = response.text
+        meta = {
+            'url': url,
+            'sha256': hashlib.sha256(text.encode()).hexdigest(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        body_path = os.path.join(cache_dir, meta['sha256'] + '.txt')
+        if not os.path.exists(body_path):
+            _write(body_path, text)
+
+    meta['fetched_at'] = time.time()
+    _write(meta_path, json.dumps(meta))
+    _memo[url] = text
+    return text
+
+
+def fetch_sources(pedestrian_url, neighborhoods_url, offline=False):
+    '''
+    returns the raw pedestrian csv and neighborhoods text
+
+    online, both downloads run concurrently through the shared session.
+    offline, the copies in data/ and src/ are read instead
+    '''
+    if offline:
+        return _read(PEDESTRIAN_FILE), _read(NEIGHBORHOODS_FILE)
+
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        counts = pool.submit(fetch_text, pedestrian_url, session=session)
+        neighborhoods = pool.submit(fetch_text, neighborhoods_url, session=session)
+        return counts.result(), neighborhoods.result()
+
+
+def fetch_neighborhoods(neighborhoods_url, offline=False):
+    '''
+    returns the raw neighborhoods text alone, for callers that read the
+    counts from elsewhere
+    '''
+    return _read(NEIGHBORHOODS_FILE) if offline else fetch_text(neighborhoods_url)
+
+
+def parse_neighborhoods(text):
+    '''
+    parses the neighborhood bounds and rent data
+
+    accepts the JSON object served by the gist as well as the local
+    neighborhoods.txt layout, which lists the same entries without the
+    enclosing braces and separating commas
+    '''
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        entries = re.sub(r'}\s*\n\s*"', '},\n"', text.strip())
+        return json.loads('{' + entries + '}')
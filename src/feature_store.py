@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from data_sources import REPO_ROOT
+
+STORE_DIR = os.path.join(REPO_ROOT, '.cache', 'features')
+
+# Bump when the on-disk layout or the preprocessing steps change
+FORMAT_VERSION = 4
+
+
+def cache_key(texts, params):
+    '''
+    hash of the raw input data and the preprocessing parameters
+    '''
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}".encode())
+    for text in texts:
+        digest.update(hashlib.sha256(text.encode()).digest())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def save(df, key, store_dir=STORE_DIR):
+    '''
+    writes a dataframe as one .npy file per column plus a meta.json
+    describing the columns, so it can be memory-mapped back
+    '''
+    path = os.path.join(store_dir, key)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        entry = {'name': name, 'file': f"c{i}.npy"}
+        if pd.api.types.is_numeric_dtype(col.dtype) or pd.api.types.is_bool_dtype(col.dtype):
+            values = col.to_numpy()
+        else:
+            # text columns are stored as fixed-width unicode with a null mask
+            missing = col.isna().to_numpy()
+            values = col.where(~missing, '').astype(str).to_numpy(dtype=str)
+            if missing.any():
+                entry['mask'] = f"c{i}.mask.npy"
+                np.save(os.path.join(tmp, entry['mask']), missing)
+            entry['text'] = True
+            entry['dtype'] = str(col.dtype)
+        np.save(os.path.join(tmp, entry['file']), values)
+        columns.append(entry)
+
+    np.save(os.path.join(tmp, 'index.npy'), df.index.to_numpy())
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'version': FORMAT_VERSION, 'rows': len(df), 'columns': columns}, f)
+
+    # another process may have stored the same key meanwhile, keep theirs
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+
+def load(key, store_dir=STORE_DIR):
+    '''
+    loads a stored dataframe, or None if the key is not in the store
+
+    numeric columns are memory-mapped copy-on-write and wrapped without
+    copying: the frame is writable like a freshly built one, and writes stay
+    private to the process instead of reaching the store. text columns get
+    back the dtype they were saved with
+    '''
+    path = os.path.join(store_dir, key)
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    data = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(path, entry['file']), mmap_mode='c')
+        if entry.get('text'):
+            values = pd.Series(values, dtype=object)
+            if 'mask' in entry:
+                values[np.load(os.path.join(path, entry['mask']))] = np.nan
+            values = values.astype(entry.get('dtype', object)).array
+        data[entry['name']] = values
+
+    index = np.load(os.path.join(path, 'index.npy'))
+    return pd.DataFrame(data, index=index, copy=False)
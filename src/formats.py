@@ -0,0 +1,347 @@
+import importlib.util
+import time
+
+import numpy as np
+import pandas as pd
+
+from optimization import (PREP_PARAMS, SCHEDULES, best_schedule, model_params, operating_labels,
+                          period_margins, select_candidates)
+
+# Shop sizes offered at every location, sqft
+FORMATS = (600, 800, 1000)
+
+# Largest DP table (shop count x budget units x locations) tried before
+# falling back to the greedy solution
+DP_MAX_CELLS = 50_000_000
+
+
+def format_options(candidate_locs, day='May07', formats=FORMATS, build_out_per_sqft=0.0,
+                   rent_months=1, **params):
+    '''
+    value and budget cost of every (location, format)
+
+    value is the best-schedule daily profit at that shop size, cost is
+    size x (build_out_per_sqft + rent_months x monthly rent per sqft).
+    returns (locations, formats) arrays of values, costs and the best
+    schedule index
+    '''
+    rent_daily = candidate_locs['rent_per_sqft_daily'].to_numpy(dtype=float)
+    rent_monthly = rent_daily * PREP_PARAMS['days_per_month']
+    values, costs, schedules = [], [], []
+    for size in formats:
+        best, profit = best_schedule(*period_margins(candidate_locs, day, model_params(shop_size=size, **params)))
+        values.append(profit)
+        costs.append(size * (build_out_per_sqft + rent_months * rent_monthly))
+        schedules.append(best)
+    return np.column_stack(values), np.column_stack(costs), np.column_stack(schedules)
+
+
+def remove_dominated(values, costs, eligible):
+    '''
+    drops options another format of the same location beats on both value
+    and cost; an optimal selection never needs them
+    '''
+    v = np.where(eligible, values, -np.inf)
+    c = np.where(eligible, costs, np.inf)
+    beaten = ((v[:, None, :] >= v[:, :, None]) & (c[:, None, :] <= c[:, :, None])
+              & ((v[:, None, :] > v[:, :, None]) | (c[:, None, :] < c[:, :, None])))
+    # equal options: keep the first
+    n_formats = values.shape[1]
+    same = (v[:, None, :] == v[:, :, None]) & (c[:, None, :] == c[:, :, None])
+    earlier = np.arange(n_formats)[None, :] < np.arange(n_formats)[:, None]
+    return eligible & ~(beaten | (same & earlier[None])).any(axis=2)
+
+
+def lagrangian_bound(values, costs, eligible, budget, max_shops=None, iterations=80):
+    '''
+    upper bound on the best selection by relaxing the budget (multiplier
+    lam) and the shop cap (mu): every location then simply takes its best
+    option with value - lam * cost - mu > 0. minimizing over lam and mu gives
+    the LP relaxation bound; any lam, mu >= 0 is a valid bound, so the
+    search only has to be close
+
+    returns the bound and the multipliers (lam, mu)
+    '''
+    v = np.where(eligible, values, -np.inf)
+
+    def dual(lam, mu):
+        reduced = v - lam * costs - mu
+        best = reduced.argmax(axis=1)
+        gain = reduced[np.arange(len(best)), best]
+        taken = gain > 0
+        bound = gain[taken].sum() + lam * budget + mu * (max_shops or 0)
+        return bound, costs[np.arange(len(best)), best][taken].sum()
+
+    def best_lam(mu):
+        # budget used falls as lam grows: bisect for where it crosses the budget
+        lo, hi = 0.0, float(np.max(np.where(eligible, values / np.maximum(costs, 1e-9), 0), initial=0))
+        if dual(lo, mu)[1] <= budget:
+            return lo
+        for _ in range(iterations // 2):
+            mid = (lo + hi) / 2
+            lo, hi = (mid, hi) if dual(mid, mu)[1] > budget else (lo, mid)
+        # compare both ends, the kink can sit on either
+        return min((lo, hi), key=lambda lam: dual(lam, mu)[0])
+
+    def bound_at(mu):
+        lam = best_lam(mu)
+        return dual(lam, mu)[0], lam, mu
+
+    if max_shops is None:
+        bound, lam, mu = bound_at(0.0)
+        return bound, (lam, mu)
+
+    # the bound is convex in mu: golden-section search, one new point per step
+    lo, hi = 0.0, float(np.max(np.where(eligible, values, 0), initial=0))
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = bound_at(hi - ratio * (hi - lo)), bound_at(lo + ratio * (hi - lo))
+    best = min(bound_at(0.0), a, b)
+    for _ in range(iterations // 2):
+        if a[0] <= b[0]:
+            hi, b = b[2], a
+            a = bound_at(hi - ratio * (hi - lo))
+        else:
+            lo, a = a[2], b
+            b = bound_at(lo + ratio * (hi - lo))
+        best = min(best, a, b)
+    bound, lam, mu = best
+    return bound, (lam, mu)
+
+
+def greedy_selection(values, costs, eligible, budget, max_shops=None, multipliers=(0.0, 0.0)):
+    '''
+    feasible selection: each location's best option under the multipliers,
+    trimmed to the budget and shop cap, then topped up in order of value
+    per dollar. returns the chosen format per location (-1 for none)
+    '''
+    n, n_formats = values.shape
+    lam, mu = multipliers
+    reduced = np.where(eligible, values - lam * costs - mu, -np.inf)
+    choice = np.where(reduced.max(axis=1) > 0, reduced.argmax(axis=1), -1)
+
+    # drop the least profitable shops until within budget and cap
+    rows = np.flatnonzero(choice >= 0)
+    chosen_values = values[rows, choice[rows]]
+    spent = costs[rows, choice[rows]].sum()
+    count = len(rows)
+    for i in rows[np.argsort(chosen_values)]:
+        if spent <= budget and (max_shops is None or count <= max_shops):
+            break
+        spent -= costs[i, choice[i]]
+        count -= 1
+        choice[i] = -1
+
+    # top up: add or upgrade options while they fit
+    density = np.where(eligible, values / np.maximum(costs, 1e-9), -np.inf)
+    for flat in np.argsort(-density, axis=None):
+        i, f = divmod(int(flat), n_formats)
+        if not eligible[i, f]:
+            break
+        current = choice[i]
+        if current >= 0:
+            extra = costs[i, f] - costs[i, current]
+            if values[i, f] > values[i, current] and spent + extra <= budget:
+                choice[i] = f
+                spent += extra
+        elif spent + costs[i, f] <= budget and (max_shops is None or count < max_shops):
+            choice[i] = f
+            spent += costs[i, f]
+            count += 1
+    return choice
+
+
+def dp_selection(values, costs, eligible, budget, max_shops=None, budget_unit=1.0):
+    '''
+    multiple-choice knapsack by dynamic programming over budget units (and
+    shop count when capped). costs are rounded up to whole units and the
+    budget down, so the result is always feasible and optimal when the
+    costs are whole units. returns the chosen format per location (-1 for
+    none), or None if the table would exceed DP_MAX_CELLS
+    '''
+    n, n_formats = values.shape
+    weights = np.ceil(costs / budget_unit - 1e-9).astype(np.int64)
+    capacity = int(np.floor(budget / budget_unit + 1e-9))
+    rows = 1 if max_shops is None else min(max_shops, n) + 1
+    if n * rows * (capacity + 1) > DP_MAX_CELLS:
+        return None
+
+    # best[k, b]: best value with at most b units over k shops (or any count)
+    best = np.full((rows, capacity + 1), -np.inf)
+    best[0] = 0.0
+    if max_shops is None:
+        best[:] = 0.0
+    picks = np.zeros((n, rows, capacity + 1), dtype=np.int8)
+    for i in range(n):
+        updated = best.copy()
+        for f in range(n_formats):
+            w = weights[i, f]
+            if not eligible[i, f] or w > capacity:
+                continue
+            candidate = np.full_like(best, -np.inf)
+            if max_shops is None:
+                candidate[:, w:] = best[:, :capacity + 1 - w] + values[i, f]
+            else:
+                candidate[1:, w:] = best[:-1, :capacity + 1 - w] + values[i, f]
+            better = candidate > updated
+            updated[better] = candidate[better]
+            picks[i][better] = f + 1
+        best = updated
+
+    choice = np.full(n, -1)
+    k, b = int(best[:, capacity].argmax()), capacity
+    for i in range(n - 1, -1, -1):
+        f = picks[i, k, b] - 1
+        if f >= 0:
+            choice[i] = f
+            b -= weights[i, f]
+            k -= 0 if max_shops is None else 1
+    return choice
+
+
+def _selection_value(values, choice):
+    rows = np.flatnonzero(choice >= 0)
+    return float(values[rows, choice[rows]].sum())
+
+
+def _solve_gurobi(values, costs, keep, budget, max_shops, start):
+    '''
+    the multiple-choice knapsack over the options left after pruning, warm
+    started from the best heuristic selection
+    '''
+    import gurobipy as gp
+    from gurobipy import GRB
+    import scipy.sparse as sp
+
+    loc, fmt = np.nonzero(keep)
+    model = gp.Model('format_selection')
+    model.Params.OutputFlag = 0
+    x = model.addMVar(len(loc), vtype=GRB.BINARY, name='open_format')
+    model.setObjective(values[loc, fmt] @ x, GRB.MAXIMIZE)
+
+    # at most one format per location
+    groups, group = np.unique(loc, return_inverse=True)
+    one_each = sp.csr_matrix((np.ones(len(loc)), (group, np.arange(len(loc)))), shape=(len(groups), len(loc)))
+    model.addConstr(one_each @ x <= 1, name='one_format')
+    model.addConstr(costs[loc, fmt] @ x <= budget, name='budget')
+    if max_shops is not None:
+        model.addConstr(x.sum() <= max_shops, name='max_shops')
+
+    x.Start = (start[loc] == fmt).astype(float)
+    model.optimize()
+    if model.SolCount == 0:
+        return None
+    choice = np.full(keep.shape[0], -1)
+    chosen = x.X > 0.5
+    choice[loc[chosen]] = fmt[chosen]
+    return choice
+
+
+def default_method():
+    '''
+    'gurobi' when gurobipy is installed, the exact-for-whole-units DP
+    otherwise
+    '''
+    return 'gurobi' if importlib.util.find_spec('gurobipy') else 'dp'
+
+
+def select_formats(df, budget, day='May07', max_shops=None, formats=FORMATS, build_out_per_sqft=0.0,
+                   rent_months=1, budget_unit=None, method=None, verbose=True, **params):
+    '''
+    picks at most one shop format per location, maximizing total daily
+    profit under a budget on size x (build-out + rent_months of rent) and
+    an optional cap on the number of shops; only options clearing the
+    daily profit floor are considered
+
+    a Lagrangian (LP) bound and a greedy selection are computed first. with
+    budget_unit set, a DP over whole budget units gives a second, exact for
+    unit costs, selection. options whose bound cannot beat the best of these
+    are pruned before Gurobi solves the rest from that warm start.
+    method='greedy' or 'dp' stops before Gurobi; by default Gurobi is used
+    when installed (see default_method)
+
+    returns the selected shops and a summary dict
+    '''
+    method = method or default_method()
+    floor = model_params(**params)['min_daily_profit']
+    candidate_locs = select_candidates(df, day)
+    values, costs, schedules = format_options(candidate_locs, day, formats, build_out_per_sqft,
+                                              rent_months, **params)
+    summary = {'options': int(values.size)}
+
+    start = time.perf_counter()
+    eligible = remove_dominated(values, costs, (values >= floor) & (costs <= budget))
+    bound, multipliers = lagrangian_bound(values, costs, eligible, budget, max_shops)
+    choice = greedy_selection(values, costs, eligible, budget, max_shops, multipliers)
+    summary.update(eligible=int(eligible.sum()), bound=bound, greedy=_selection_value(values, choice))
+
+    if budget_unit is not None or method == 'dp':
+        dp_choice = dp_selection(values, costs, eligible, budget, max_shops, budget_unit or 1.0)
+        summary['dp'] = None if dp_choice is None else _selection_value(values, dp_choice)
+        if dp_choice is not None and summary['dp'] > summary['greedy']:
+            choice = dp_choice
+    incumbent = _selection_value(values, choice)
+    summary['heuristic_time'] = time.perf_counter() - start
+
+    if method == 'gurobi':
+        # prune options whose bound with that option forced in cannot beat the incumbent
+        lam, mu = multipliers
+        reduced = np.where(eligible, values - lam * costs - mu, -np.inf)
+        others = bound - np.maximum(reduced.max(axis=1), 0)
+        keep = eligible & ((others[:, None] + reduced > incumbent + 1e-6)
+                           | (np.arange(len(formats)) == choice[:, None]))
+        summary['kept'] = int(keep.sum())
+
+        start = time.perf_counter()
+        solved = _solve_gurobi(values, costs, keep, budget, max_shops, choice) if keep.any() else None
+        summary['solve_time'] = time.perf_counter() - start
+        if solved is not None and _selection_value(values, solved) >= incumbent:
+            choice = solved
+    summary['objective'] = _selection_value(values, choice)
+
+    if verbose:
+        print(f"{summary['eligible']} of {summary['options']} options eligible, bound "
+              f"${summary['bound']:,.2f}, greedy ${summary['greedy']:,.2f}"
+              + (f", DP ${summary['dp']:,.2f}" if summary.get('dp') is not None else '')
+              + (f", kept {summary['kept']} for Gurobi" if 'kept' in summary else '')
+              + f", best ${summary['objective']:,.2f}")
+
+    rows = np.flatnonzero(choice >= 0)
+    picked = choice[rows]
+    rent_daily = candidate_locs['rent_per_sqft_daily'].to_numpy(dtype=float)[rows]
+    sizes = np.array(formats)[picked]
+    selected = pd.DataFrame({
+        'Location': candidate_locs.index[rows],
+        'Shop Size': sizes,
+        'Operating Times': operating_labels(SCHEDULES[schedules[rows, picked]]),
+        'Budget Cost': costs[rows, picked],
+        'Daily Rent': rent_daily * sizes,
+        'Daily Profit': values[rows, picked],
+    })
+    summary['spent'] = float(selected['Budget Cost'].sum())
+    return selected.sort_values('Daily Profit', ascending=False).round(2), summary
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL
+    from optimization import prepare_data
+
+    parser = argparse.ArgumentParser(description="Pick shop formats under a budget")
+    parser.add_argument('--budget', type=float, required=True,
+                        help="total of size x (build-out + rent months x monthly rent), $")
+    parser.add_argument('--max-shops', type=int, default=None)
+    parser.add_argument('--build-out', type=float, default=0.0, help="build-out cost, $/sqft")
+    parser.add_argument('--rent-months', type=float, default=1, help="months of rent counted")
+    parser.add_argument('--budget-unit', type=float, default=None, help="DP budget granularity, $")
+    parser.add_argument('--method', choices=['gurobi', 'dp', 'greedy'], default=None,
+                        help="default: gurobi when installed, dp otherwise")
+    parser.add_argument('--offline', action='store_true',
+                        help="read the local data files instead of downloading the gists")
+    args = parser.parse_args()
+
+    df_processed = prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline)
+    selected, summary = select_formats(df_processed, args.budget, max_shops=args.max_shops,
+                                       build_out_per_sqft=args.build_out, rent_months=args.rent_months,
+                                       budget_unit=args.budget_unit, method=args.method)
+    print(selected.to_string(index=False))
+    print(f"\nSpent ${summary['spent']:,.2f} of ${args.budget:,.2f}")
@@ -1,11 +1,22 @@
 import pandas as pd
-from shapely.geometry import Point
-import requests
 from io import StringIO
-import json
+from data_sources import fetch_sources, parse_neighborhoods
+from rent_zones import zone_index
+from traffic import canonicalize_columns
+from instrumentation import span, timed
 
 
-def get_neighborhoods(pedestrian_counts_url, neighborhoods_url):
+def parse_points(geometry):
+    '''
+    turns the POINT(lon lat) column into float lat/lon columns,
+    rounded to 3 decimals
+    '''
+    coords = geometry.str.extract(r'POINT\s*\(\s*(\S+)\s+(\S+)\s*\)').astype(float)
+    return coords[1].round(3), coords[0].round(3)
+
+
+@timed('get_neighborhoods')
+def get_neighborhoods(pedestrian_counts_url, neighborhoods_url, offline=False, rent_fallback=None):
 
     '''
     pedestrian count: csv of pedestrian counts
@@ -14,39 +25,37 @@ def get_neighborhoods(pedestrian_counts_url, neighborhoods_url):
     
     imports the pedestrian data and assigns rent values
     based on the lat and lon of the points
+
+    offline reads the local copies in data/ and src/ instead of the gists
+
+    rent_fallback ('nearest' or 'idw') gives sites outside every zone the
+    rent of the zones around them instead of leaving it empty
     '''
 
-    # load the data from gist
-    df = pd.read_csv(StringIO(requests.get(pedestrian_counts_url).text))
-    # print(df)
-    neighborhoods = json.loads(requests.get(neighborhoods_url).text)
-
-    def get_lat_lon(point):
-        '''
-        turns the POINT('lat lon') column into a float lat/lon variable
-        '''
-        # print(point)
-        coords = point.strip('POINT ()').split()
-        lat, lon = round(float(coords[1]), 3), round(float(coords[0]), 3)
-        return lat, lon
-
-    # adds latitude and longitude column to the df as floats
-    df[['latitude', 'longitude']] = df['the_geom'].apply(lambda x: pd.Series(get_lat_lon(x)))
-    # print(df)
-
-    def assign_rent(lat, lon):
-        '''
-        assigns the avg rent per sqft depending on the lat/long
-        that the point is located in
-        '''
-
-        for area, data in neighborhoods.items():
-            if data['lat_min'] <= lat <= data['lat_max'] and data['lon_min'] <= lon <= data['lon_max']:
-                return data['rent']
-        return None
-    
-    df['rent_per_sqft'] = df.apply(lambda row: assign_rent(row['latitude'], row['longitude']), axis=1)
-    # print(df[['latitude', 'longitude', 'rent_per_sqft']])
+    # load the data from gist (cached on disk) or the local copies
+    with span('fetch_sources'):
+        counts_text, neighborhoods_text = fetch_sources(pedestrian_counts_url, neighborhoods_url, offline)
+    with span('parse_csv'):
+        df = canonicalize_columns(pd.read_csv(StringIO(counts_text)))
+        # print(df)
+        neighborhoods = parse_neighborhoods(neighborhoods_text)
+
+    # latitude and longitude as floats
+    with span('parse_points'):
+        lat, lon = parse_points(df['the_geom'])
+
+    # the avg rent per sqft of the first zone the point falls in
+    with span('assign_rent'):
+        rent = zone_index(neighborhoods).rents(lat, lon, fallback=rent_fallback)
+
+    # added in one step: read_csv returns one block per column, so inserting
+    # them one at a time fragments the frame
+    df = pd.concat([df, pd.DataFrame({'latitude': lat, 'longitude': lon, 'rent_per_sqft': rent},
+                                     index=df.index)], axis=1)
+    missing = df['rent_per_sqft'].isna().sum()
+    if missing:
+        print(f"{missing} of {len(df)} sites are outside every rent zone and will be dropped "
+              f"(see zone_coverage.py, or use a rent fallback)")
 
     return df
 
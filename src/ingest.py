@@ -0,0 +1,371 @@
+import hashlib
+import io
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from data_sources import NEIGHBORHOODS_URL, REPO_ROOT, fetch_neighborhoods, parse_neighborhoods
+from instrumentation import span, timed
+from traffic import PERIODS, WINDOW_HOURS, count_columns, survey_date, window_period
+
+STATE_DIR = os.path.join(REPO_ROOT, '.cache', 'ingest')
+
+# Rows parsed at a time; peak memory scales with this, not with the file
+CHUNK_ROWS = 100_000
+COUNT_DTYPE = np.float32
+
+# Hourly counter exports: one row per location and hour
+TIME_COLUMN = 'timestamp'
+HOURLY_COUNT = 'count'
+
+# Survey names of hourly data, spelled like the bi-annual columns (May07, Sept07)
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'June', 'July', 'Aug', 'Sept', 'Oct', 'Nov', 'Dec']
+
+# Bytes of the file start hashed to notice a rewritten (not appended) file
+HEAD_BYTES = 64 * 1024
+
+
+class CountAggregator:
+    '''
+    running per-location, per-survey, per-period count totals
+
+    sums and observations are (locations, surveys, periods) arrays grown as
+    new locations and surveys show up, so memory follows the number of
+    locations and surveys rather than rows. the average of each cell is
+    what TrafficCube.from_frame would give for the same rows: the mean of
+    the observed counts
+
+    rows come either from the bi-annual layout (one Survey_PERIOD column per
+    count, see add_wide) or from hourly counters (Loc, timestamp, count,
+    see add_hourly)
+    '''
+
+    def __init__(self):
+        self.keys = []
+        self.rows = {}
+        self.surveys = []
+        self.columns = {}
+        self.sums = np.zeros((0, 0, len(PERIODS)))
+        self.observed = np.zeros((0, 0, len(PERIODS)), dtype=np.int64)
+        self.coords = np.zeros((0, 2))
+
+    def _locate(self, locs, lat, lon):
+        '''
+        row of every Loc, adding unseen locations with their first coordinates
+        '''
+        new = [loc for loc in pd.unique(locs) if loc not in self.rows]
+        if new:
+            for loc in new:
+                self.rows[loc] = len(self.keys)
+                self.keys.append(loc)
+            self._grow(len(self.keys), len(self.surveys))
+        rows = np.fromiter((self.rows[loc] for loc in locs), dtype=np.int64, count=len(locs))
+        if new:
+            first = len(self.keys) - len(new)
+            positions = pd.Series(np.arange(len(rows))).groupby(rows).first()
+            positions = positions[positions.index >= first]
+            self.coords[positions.index, 0] = lat[positions.to_numpy()]
+            self.coords[positions.index, 1] = lon[positions.to_numpy()]
+        return rows
+
+    def _survey(self, survey):
+        if survey not in self.columns:
+            self.columns[survey] = len(self.surveys)
+            self.surveys.append(survey)
+            self._grow(len(self.keys), len(self.surveys))
+        return self.columns[survey]
+
+    def _grow(self, n_locations, n_surveys):
+        capacity, width = self.sums.shape[:2]
+        if n_locations <= capacity and n_surveys <= width:
+            return
+        capacity = max(n_locations, 2 * capacity) if n_locations > capacity else capacity
+        width = max(n_surveys, width)
+        shape = (capacity, width, len(PERIODS))
+        for name in ('sums', 'observed'):
+            old = getattr(self, name)
+            grown = np.zeros(shape, dtype=old.dtype)
+            grown[:old.shape[0], :old.shape[1]] = old
+            setattr(self, name, grown)
+        coords = np.full((capacity, 2), np.nan)
+        coords[:len(self.coords)] = self.coords
+        self.coords = coords
+
+    def add_wide(self, chunk):
+        '''
+        adds rows of the bi-annual layout: Loc, the_geom (or latitude and
+        longitude) and one column per survey and period
+        '''
+        lat, lon = _coordinates(chunk)
+        rows = self._locate(chunk['Loc'].to_numpy(), lat, lon)
+        for col, (survey, period) in count_columns(chunk.columns).items():
+            values = chunk[col].to_numpy()
+            seen = ~np.isnan(values)
+            s, p = self._survey(survey), PERIODS.index(period)
+            np.add.at(self.sums[:, s, p], rows[seen], values[seen])
+            np.add.at(self.observed[:, s, p], rows[seen], 1)
+
+    def add_hourly(self, chunk):
+        '''
+        adds hourly counter rows: Loc, timestamp, count and the_geom (or
+        latitude and longitude)
+
+        hours inside a period's count window are scaled to the whole window,
+        so a cell averages to the expected window total, as in the bi-annual
+        counts. the survey is the month of the timestamp, e.g. Sept24; hours
+        outside every window are skipped
+        '''
+        time = pd.to_datetime(chunk[TIME_COLUMN])
+        period = window_period(time.dt.hour.to_numpy())
+        counts = chunk[HOURLY_COUNT].to_numpy()
+        use = (period >= 0) & ~np.isnan(counts)
+        if not use.any():
+            return
+        lat, lon = _coordinates(chunk)
+        rows = self._locate(chunk['Loc'].to_numpy()[use], lat[use], lon[use])
+
+        month = (time.dt.year.to_numpy() * 12 + time.dt.month.to_numpy() - 1)[use]
+        months, month_pos = np.unique(month, return_inverse=True)
+        columns = np.array([self._survey(f"{MONTH_NAMES[m % 12]}{m // 12 % 100:02d}") for m in months])
+        cells = (rows, columns[month_pos], period[use])
+        np.add.at(self.sums, cells, counts[use] * WINDOW_HOURS[period[use]])
+        np.add.at(self.observed, cells, 1)
+
+    def to_frame(self):
+        '''
+        one row per location with latitude, longitude and a COUNT_DTYPE
+        Survey_PERIOD column per survey and period (NaN when never observed),
+        surveys in date order
+        '''
+        n = len(self.keys)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (self.sums[:n] / self.observed[:n]).astype(COUNT_DTYPE)
+        data = {'Loc': self.keys, 'latitude': self.coords[:n, 0], 'longitude': self.coords[:n, 1]}
+        for survey in sorted(self.surveys, key=survey_date):
+            for p, period in enumerate(PERIODS):
+                data[f'{survey}_{period}'] = means[:, self.columns[survey], p]
+        return pd.DataFrame(data)
+
+    def state(self):
+        '''
+        the arrays needed to resume, for save_state
+        '''
+        n = len(self.keys)
+        return {'keys': np.asarray(self.keys), 'surveys': np.array(self.surveys, dtype=str),
+                'sums': self.sums[:n], 'observed': self.observed[:n], 'coords': self.coords[:n]}
+
+    @classmethod
+    def from_state(cls, arrays):
+        aggregator = cls()
+        aggregator.keys = arrays['keys'].tolist()
+        aggregator.rows = {loc: i for i, loc in enumerate(aggregator.keys)}
+        aggregator.surveys = arrays['surveys'].tolist()
+        aggregator.columns = {s: i for i, s in enumerate(aggregator.surveys)}
+        aggregator.sums = arrays['sums'].copy()
+        aggregator.observed = arrays['observed'].copy()
+        aggregator.coords = arrays['coords'].copy()
+        return aggregator
+
+
+def _coordinates(chunk):
+    if 'the_geom' in chunk.columns:
+        from get_neighborhood import parse_points
+        lat, lon = parse_points(chunk['the_geom'])
+        return lat.to_numpy(), lon.to_numpy()
+    return (chunk['latitude'].to_numpy(dtype=float).round(3),
+            chunk['longitude'].to_numpy(dtype=float).round(3))
+
+
+class _Window(io.RawIOBase):
+    '''
+    read-only view of bytes [start, end) of a file, so rows appended while
+    reading are left for the next run
+    '''
+
+    def __init__(self, f, start, end):
+        f.seek(start)
+        self.f = f
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+def read_header(path):
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_chunks(path, start=0, end=None, header=None, chunk_size=CHUNK_ROWS):
+    '''
+    parses the rows in bytes [start, end) of a counts csv, chunk_size rows at
+    a time, reading only the location, coordinate and count columns and
+    counts as COUNT_DTYPE. start must be the first byte of a row; header is
+    the file's column names, required when start is past the header line
+    '''
+    header = header or read_header(path)
+    hourly = not count_columns(header)
+    counts = [HOURLY_COUNT] if hourly else list(count_columns(header))
+    keep = ['Loc'] + [c for c in ('the_geom', 'latitude', 'longitude') if c in header] + counts
+    if hourly:
+        keep.append(TIME_COLUMN)
+    missing = {'Loc', TIME_COLUMN, HOURLY_COUNT} - set(header) if hourly else set()
+    if missing or not ({'the_geom', 'latitude'} & set(header)):
+        raise ValueError(f"{path} has neither Survey_PERIOD count columns nor the hourly "
+                         f"Loc/{TIME_COLUMN}/{HOURLY_COUNT} columns with coordinates")
+
+    end = os.path.getsize(path) if end is None else end
+    with open(path, 'rb') as f:
+        stream = io.BufferedReader(_Window(f, start, end))
+        reader = pd.read_csv(stream, header=0 if start == 0 else None, names=None if start == 0 else header,
+                             usecols=keep, dtype={c: COUNT_DTYPE for c in counts}, chunksize=chunk_size)
+        for chunk in reader:
+            yield chunk, hourly
+
+
+def _complete_end(path, final=False, previous_size=None):
+    '''
+    size of the file up to the end of its last complete row
+
+    a last line without a newline can be a row still being written, even
+    one that already has every field of the header, so it is only read
+    once the file is known to be finished: final is set, or the file has
+    not changed size since previous_size was recorded by the last run.
+    otherwise it is left for the next run
+    '''
+    size = os.path.getsize(path)
+    if final or size == previous_size:
+        return size
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - HEAD_BYTES))
+        tail = f.read()
+    cut = tail.rfind(b'\n')
+    return size - len(tail) + cut + 1 if cut >= 0 else 0
+
+
+def _head_hash(path, length):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+
+def _state_path(path, state_dir):
+    return os.path.join(state_dir, hashlib.sha256(os.path.abspath(path).encode()).hexdigest())
+
+
+def load_state(path, state_dir=STATE_DIR):
+    '''
+    the saved aggregator and metadata for a counts file, or (None, None)
+    '''
+    base = _state_path(path, state_dir)
+    if not os.path.exists(base + '.json'):
+        return None, None
+    with open(base + '.json') as f:
+        meta = json.load(f)
+    with np.load(base + '.npz') as arrays:
+        return CountAggregator.from_state(arrays), meta
+
+
+def save_state(path, aggregator, meta, state_dir=STATE_DIR):
+    # arrays first, then the metadata pointing at them, each written then renamed
+    os.makedirs(state_dir, exist_ok=True)
+    base = _state_path(path, state_dir)
+    tmp = f"{base}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, **aggregator.state())
+    os.replace(tmp, base + '.npz')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, base + '.json')
+
+
+@timed('ingest_counts')
+def ingest_counts(path, chunk_size=CHUNK_ROWS, state_dir=STATE_DIR, resume=True, final=False):
+    '''
+    streams a counts csv into a CountAggregator
+
+    the aggregator and the byte offset read so far are saved in state_dir,
+    so a later call only parses rows appended since. if the file was
+    rewritten rather than appended to (its start or header changed, or it
+    shrank) it is read again from the beginning. a new bi-annual survey
+    adds columns and so rewrites the file; a new month of hourly counts is
+    just appended rows
+
+    a last row without a trailing newline is held back until a later call
+    finds the file the same size, or until final says the file is finished
+
+    returns the aggregator and the number of rows parsed by this call
+    '''
+    header = read_header(path)
+    size = os.path.getsize(path)
+    aggregator, meta = load_state(path, state_dir) if resume else (None, None)
+    if meta is not None and (meta['offset'] > size or meta['header'] != header or
+                             meta['head'] != _head_hash(path, meta['offset'])):
+        aggregator, meta = None, None
+    if aggregator is None:
+        aggregator, meta = CountAggregator(), {'offset': 0, 'rows': 0, 'header': header}
+    end = _complete_end(path, final, meta.get('size'))
+
+    rows = 0
+    if end > meta['offset']:
+        for chunk, hourly in read_chunks(path, meta['offset'], end, meta['header'], chunk_size):
+            with span('ingest.chunk'):
+                (aggregator.add_hourly if hourly else aggregator.add_wide)(chunk)
+            rows += len(chunk)
+        meta.update(offset=end, rows=meta['rows'] + rows, head=_head_hash(path, end))
+    if rows or meta.get('size') != size:
+        meta['size'] = size
+        save_state(path, aggregator, meta, state_dir)
+    return aggregator, rows
+
+
+def streamed_locations(counts_path, neighborhoods_url=NEIGHBORHOODS_URL, offline=False, rent_fallback=None,
+                       chunk_size=CHUNK_ROWS, state_dir=STATE_DIR):
+    '''
+    get_neighborhoods for large or growing counts files: streams counts_path
+    through ingest_counts and assigns rent, one compact row per location
+    '''
+    from rent_zones import zone_index
+
+    aggregator, _ = ingest_counts(counts_path, chunk_size, state_dir)
+    df = aggregator.to_frame()
+    neighborhoods = parse_neighborhoods(fetch_neighborhoods(neighborhoods_url, offline))
+    with span('assign_rent'):
+        rent = zone_index(neighborhoods).rents(df['latitude'], df['longitude'], fallback=rent_fallback)
+    return pd.concat([df, pd.DataFrame({'rent_per_sqft': rent}, index=df.index)], axis=1)
+
+
+def prepare_streamed(counts_path, neighborhoods_url=NEIGHBORHOODS_URL, offline=False, rent_fallback=None,
+                     chunk_size=CHUNK_ROWS, state_dir=STATE_DIR):
+    '''
+    prepare_data for large or growing counts files: streamed_locations
+    followed by the same preprocessing
+    '''
+    from optimization import PREP_PARAMS, preprocess
+
+    df = streamed_locations(counts_path, neighborhoods_url, offline, rent_fallback, chunk_size, state_dir)
+    with span('preprocess'):
+        return preprocess(df, **PREP_PARAMS)
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_sources import PEDESTRIAN_FILE
+
+    parser = argparse.ArgumentParser(description="Stream a pedestrian counts csv into per-location totals")
+    parser.add_argument('path', nargs='?', default=PEDESTRIAN_FILE)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_ROWS, help="rows parsed at a time")
+    parser.add_argument('--full', action='store_true', help="ignore the saved state and read the whole file")
+    parser.add_argument('--final', action='store_true',
+                        help="the file is finished: also read a last row that lacks a newline")
+    args = parser.parse_args()
+
+    aggregator, rows = ingest_counts(args.path, args.chunk_size, resume=not args.full, final=args.final)
+    print(f"parsed {rows} new rows: {len(aggregator.keys)} locations, {len(aggregator.surveys)} surveys")
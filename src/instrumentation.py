@@ -0,0 +1,149 @@
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Finished spans, in the order they ended; bounded for long-running processes
+SPANS = deque(maxlen=10_000)
+
+_stack = []
+_config = {'memory': False, 'profile_stage': None, 'profile_dir': None}
+
+
+def enable(memory=True, profile_stage=None, profile_dir=None):
+    '''
+    turns on peak-memory sampling (tracemalloc) and, optionally, cProfile
+    capture of every span named profile_stage. span timing is always on
+    '''
+    _config.update(memory=memory, profile_stage=profile_stage, profile_dir=profile_dir)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def reset():
+    SPANS.clear()
+    _stack.clear()
+
+
+@contextmanager
+def span(name):
+    '''
+    times a pipeline stage. spans nest; with memory sampling on, each span
+    records the peak traced memory reached while it was open
+    '''
+    tracing = _config['memory'] and tracemalloc.is_tracing()
+    if tracing:
+        # fold the peak so far into the enclosing span before restarting it
+        if _stack:
+            _stack[-1]['peak_memory'] = max(_stack[-1]['peak_memory'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    record = {'name': name, 'parent': _stack[-1]['name'] if _stack else None,
+              'depth': len(_stack), 'peak_memory': 0}
+    profiler = cProfile.Profile() if name == _config['profile_stage'] else None
+    _stack.append(record)
+    start = time.perf_counter()
+    record['start'] = start
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler:
+            profiler.disable()
+        record['duration'] = time.perf_counter() - start
+        _stack.pop()
+        if tracing:
+            record['peak_memory'] = max(record['peak_memory'], tracemalloc.get_traced_memory()[1])
+            if _stack:
+                _stack[-1]['peak_memory'] = max(_stack[-1]['peak_memory'], record['peak_memory'])
+        else:
+            record.pop('peak_memory')
+        if profiler:
+            record['profile'] = _profile_summary(profiler, name)
+        SPANS.append(record)
+
+
+def timed(name):
+    '''
+    decorator form of span
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _profile_summary(profiler, name):
+    '''
+    top functions by cumulative time, and the raw .prof file if a directory
+    was given
+    '''
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+    summary = {'top': out.getvalue()}
+    if _config['profile_dir']:
+        path = f"{_config['profile_dir'].rstrip('/')}/{name}.prof"
+        profiler.dump_stats(path)
+        summary['file'] = path
+    return summary
+
+
+def trace():
+    '''
+    finished spans ordered by start time, with start offsets relative to
+    the first span
+    '''
+    spans = sorted(SPANS, key=lambda s: s['start'])
+    origin = spans[0]['start'] if spans else 0
+    return [dict(s, start=s['start'] - origin) for s in spans]
+
+
+def write_trace(path):
+    '''
+    writes the spans as JSON
+    '''
+    with open(path, 'w') as f:
+        json.dump({'spans': trace()}, f, indent=2)
+    print(f"Trace written to {path}")
+
+
+def print_summary():
+    '''
+    one line per span, indented by nesting depth
+    '''
+    for s in trace():
+        memory = f"  peak {s['peak_memory'] / 1e6:8.1f} MB" if 'peak_memory' in s else ''
+        print(f"{'  ' * s['depth']}{s['name']:<{32 - 2 * s['depth']}} {s['duration']:8.3f}s{memory}")
+
+
+def add_profile_arguments(parser):
+    '''
+    adds --profile / --profile-stage to an entry point's argument parser
+    '''
+    parser.add_argument('--profile', nargs='?', const='trace.json', default=None, metavar='TRACE',
+                        help="record stage timings and peak memory, write a JSON trace "
+                             "(default trace.json)")
+    parser.add_argument('--profile-stage', default=None, metavar='STAGE',
+                        help="also capture a cProfile of this stage, e.g. solve; implies --profile")
+
+
+def start_profiling(args):
+    if args.profile_stage and not args.profile:
+        args.profile = 'trace.json'
+    if args.profile:
+        enable(memory=True, profile_stage=args.profile_stage)
+
+
+def finish_profiling(args):
+    if args.profile:
+        print_summary()
+        write_trace(args.profile)
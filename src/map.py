@@ -1,10 +1,19 @@
 # create_map.py
 import folium
+from folium.plugins import FastMarkerCluster
+import json
+import os
+import time
 import pandas as pd
 from typing import Union, Set, List
 from get_neighborhood import get_neighborhoods
 from optimization import prepare_data, optimize_coffee_shops
+from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL
+from traffic import count_columns, traffic_cube
+from instrumentation import span, timed, add_profile_arguments, start_profiling, finish_profiling
+import argparse
 
+@timed('create_map')
 def create_map(
     all_locations_df: pd.DataFrame,
     profitable_locations: Union[Set[int], List[int]],
@@ -12,7 +21,8 @@ def create_map(
     profit_data: pd.DataFrame = None,
     tile_style: str = "OpenStreetMap",
     min_zoom: int = 10,
-    max_zoom: int = 18
+    max_zoom: int = 18,
+    mode: str = "markers"
 ) -> None:
     """
     Creates an interactive folium map highlighting profitable coffee shop locations.
@@ -29,7 +39,15 @@ def create_map(
         tile_style: Map tile style (e.g., "OpenStreetMap", "Stamen Terrain", "CartoDB positron")
         min_zoom: Minimum zoom level
         max_zoom: Maximum zoom level
+        mode: "markers" adds one CircleMarker per location. "cluster" sends the
+              locations as one columnar array to a FastMarkerCluster layer that
+              builds markers, tooltips and profit-band colors in the browser,
+              so the HTML stays small for tens of thousands of sites
     """
+    start = time.perf_counter()
+    if mode not in ("markers", "cluster"):
+        raise ValueError(f"Unknown mode {mode!r}, expected 'markers' or 'cluster'")
+
     # Validate input data
     required_columns = {'Loc', 'latitude', 'longitude'}
     if not required_columns.issubset(all_locations_df.columns):
@@ -71,7 +89,15 @@ def create_map(
     feature_group_profitable = folium.FeatureGroup(name="Optimal Locations (>$500/day)")
     feature_group_other = folium.FeatureGroup(name="All Locations")
     
-    # Merge profit data if provided
+    # Average daily traffic from the traffic cube when the frame has none
+    if 'daily_avg' not in all_locations_df.columns and count_columns(all_locations_df.columns):
+        cube = traffic_cube(all_locations_df)
+        daily_avg = pd.Series(cube.daily_avg(), index=cube.locations)
+        all_locations_df = all_locations_df.assign(daily_avg=daily_avg.reindex(all_locations_df['Loc']).to_numpy())
+
+    # Merge profit data if provided (optimize_coffee_shops names the ID column 'Location')
+    if profit_data is not None and 'Loc' not in profit_data.columns and 'Location' in profit_data.columns:
+        profit_data = profit_data.rename(columns={'Location': 'Loc'})
     if profit_data is not None and 'Loc' in profit_data.columns:
         all_locations_df = all_locations_df.merge(
             profit_data,
@@ -79,6 +105,13 @@ def create_map(
             how='left'
         )
     
+    additional_fields = ['daily_avg', 'rent_per_sqft', 'Daily Profit', 'Operating Times', 'Daily Customers']
+
+    if mode == "cluster":
+        _add_cluster_layer(m, all_locations_df, profitable_set, additional_fields)
+        _finish_map(m, output_file, start)
+        return
+
     # Add markers with enhanced tooltips
     for _, row in all_locations_df.iterrows():
         location_id = row['Loc']
@@ -87,10 +120,9 @@ def create_map(
         # Prepare tooltip content
         tooltip_content = f"<b>Location ID:</b> {location_id}<br>"
         
-        # Add additional info if available
-        additional_fields = ['daily_avg', 'rent_per_sqft', 'Daily Profit', 'Operating Times', 'Daily Customers']
+        # Add additional info if available (locations without results have NaN fields)
         for field in additional_fields:
-            if field in row:
+            if field in row and pd.notna(row[field]):
                 value = row[field]
                 if isinstance(value, (int, float)):
                     value = f"{value:,.2f}"
@@ -123,6 +155,73 @@ def create_map(
     feature_group_profitable.add_to(m)
     feature_group_other.add_to(m)
     
+    _finish_map(m, output_file, start)
+
+
+# Marker color by daily profit band, darkest for the most profitable
+PROFIT_BANDS = [(5000, '#0B2545'), (2000, '#2B4C7E'), (500, '#5B8DB8')]
+OTHER_COLOR = '#A0A7B0'
+
+
+def _add_cluster_layer(m, all_locations_df, profitable_set, additional_fields):
+    """
+    Adds every location to one FastMarkerCluster layer. Each row is
+    [lat, lon, loc, profitable, *fields]; the JS callback builds the marker,
+    tooltip and color from it
+    """
+    fields = [f for f in additional_fields if f in all_locations_df.columns]
+    columns = all_locations_df[['latitude', 'longitude', 'Loc'] + fields].copy()
+    columns.insert(3, 'profitable', all_locations_df['Loc'].isin(profitable_set).astype(int))
+    # ~1 m precision is plenty on a city map and keeps the payload small
+    columns[['latitude', 'longitude']] = columns[['latitude', 'longitude']].round(5)
+    for field in fields:
+        if pd.api.types.is_numeric_dtype(columns[field]):
+            columns[field] = columns[field].round(2)
+    # NaN is not valid JSON, send null instead
+    data = columns.astype(object).where(columns.notna(), None).to_numpy().tolist()
+
+    labels = [f.replace('_', ' ').title() for f in fields]
+    profit_idx = 4 + fields.index('Daily Profit') if 'Daily Profit' in fields else -1
+    callback = f"""function (row) {{
+        var labels = {json.dumps(labels)};
+        var bands = {json.dumps(PROFIT_BANDS)};
+        var color = '{OTHER_COLOR}';
+        var profit = {profit_idx} >= 0 ? row[{profit_idx}] : null;
+        if (row[3] && profit !== null) {{
+            for (var b = 0; b < bands.length; b++) {{
+                if (profit >= bands[b][0]) {{ color = bands[b][1]; break; }}
+            }}
+        }}
+        var html = '<b>Location ID:</b> ' + row[2] + '<br>';
+        for (var i = 0; i < labels.length; i++) {{
+            var value = row[4 + i];
+            if (value === null || value === undefined) {{
+                continue;
+            }}
+            if (typeof value === 'number') {{
+                value = value.toLocaleString('en-US', {{minimumFractionDigits: 2, maximumFractionDigits: 2}});
+            }}
+            html += '<b>' + labels[i] + ':</b> ' + value + '<br>';
+        }}
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {{
+            radius: 5, color: color, weight: 1.5, fillColor: color, fillOpacity: 0.9
+        }});
+        marker.bindTooltip(html);
+        marker.bindPopup('Location ' + row[2]);
+        return marker;
+    }}"""
+
+    FastMarkerCluster(
+        data,
+        callback=callback,
+        name="Locations by Daily Profit",
+        disableClusteringAtZoom=15,
+        chunkedLoading=True,
+    ).add_to(m)
+
+
+def _finish_map(m, output_file, start):
+    """Adds the layer control and title, saves the map and reports time and size"""
     # Add layer control
     folium.LayerControl().add_to(m)
     
@@ -136,21 +235,29 @@ def create_map(
     m.get_root().html.add_child(folium.Element(title_html))
     
     # Save map
-    m.save(output_file)
-    print(f"Map successfully saved to {output_file}")
+    with span('map.save'):
+        m.save(output_file)
+    elapsed = time.perf_counter() - start
+    size_kb = os.path.getsize(output_file) / 1024
+    print(f"Map successfully saved to {output_file} ({size_kb:,.1f} KB in {elapsed:.2f}s)")
 
 # Example usage with optimization results
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the coffee shop locations map")
+    parser.add_argument('--offline', action='store_true',
+                        help="read the local data files instead of downloading the gists")
+    parser.add_argument('--mode', choices=['markers', 'cluster'], default='markers',
+                        help="cluster renders large candidate sets client-side")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
     try:
-        # URLs for data
-        pedestrian_url = "https://gist.githubusercontent.com/JoshBong/d83569f9837962d98b2c16d2312ed2d2/raw"
-        neighborhoods_url = "https://gist.githubusercontent.com/JoshBong/5e6697ffa29f3db776254188a5aea8fb/raw/6621a3cf7fcde270097be79a1b5fe5c5716ae618/gistfile1.txt"
-        
-        # Get all locations data
-        all_locations_df = get_neighborhoods(pedestrian_url, neighborhoods_url)
+        # Get all locations data (downloads are cached, so the second load is local)
+        all_locations_df = get_neighborhoods(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline)
         
         # Get optimized locations
-        df_processed = prepare_data(pedestrian_url, neighborhoods_url)
+        df_processed = prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline)
         optimal_locations = optimize_coffee_shops(df_processed)
         
         if optimal_locations is not None:
@@ -163,7 +270,8 @@ if __name__ == "__main__":
                 profitable_locations=profitable_locs,
                 profit_data=optimal_locations,
                 output_file="coffee_shop_locations.html",
-                tile_style="Stamen Terrain"
+                tile_style="Stamen Terrain",
+                mode=args.mode
             )
             
             print("Map generated with optimization results")
@@ -173,4 +281,6 @@ if __name__ == "__main__":
             
     except Exception as e:
         print(f"An error occurred: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        finish_profiling(args)
\ No newline at end of file
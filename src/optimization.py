@@ -1,123 +1,327 @@
 from get_neighborhood import get_neighborhoods
-import gurobipy as gp
-from gurobipy import GRB
+from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL, fetch_sources
+import feature_store
+from spacing import spacing_cliques
+from traffic import PERIODS, attach_cube, traffic_cube
+from instrumentation import span, timed, add_profile_arguments, start_profiling, finish_profiling
 import pandas as pd
+import numpy as np
+import argparse
+import importlib.util
+
+# Preprocessing parameters, part of the feature store key
+PREP_PARAMS = {'lower_quantile': 0.05, 'upper_quantile': 0.95, 'days_per_month': 30}
 
 # Data prep
-def prepare_data(pedestrian_url, neighborhoods_url):
-    """Load and preprocess the data"""
-    df = get_neighborhoods(pedestrian_url, neighborhoods_url)
-    
-    # Calculate daily totals
-    prefixes = set(col.split('_')[0] for col in df.columns if any(x in col for x in ['AM', 'MD', 'PM']))
-    for prefix in prefixes:
-        try:
-            df[f"{prefix}_total"] = df[f"{prefix}_AM"] + df[f"{prefix}_MD"] + df[f"{prefix}_PM"]
-        except KeyError:
-            continue
-    
-    # Clean data
-    daily_total_cols = [col for col in df.columns if col.endswith("_total")]
-    df_cleaned = df.dropna(subset=daily_total_cols)
-    df_cleaned['daily_avg'] = df_cleaned[daily_total_cols].mean(axis=1)
-    
-    # Filter outliers
-    lower_bound = df_cleaned['daily_avg'].quantile(0.05)
-    upper_bound = df_cleaned['daily_avg'].quantile(0.95)
-    filtered_df = df_cleaned[(df_cleaned['daily_avg'] >= lower_bound) & 
-                             (df_cleaned['daily_avg'] <= upper_bound)]
-    
-    # Convert monthly rent to daily
-    filtered_df['rent_per_sqft_daily'] = filtered_df['rent_per_sqft'] / 30
-    
+@timed('prepare_data')
+def prepare_data(pedestrian_url, neighborhoods_url, offline=False, use_store=True, rent_fallback=None):
+    """
+    Load and preprocess the data
+
+    The result is kept in the feature store under a hash of the raw inputs
+    and PREP_PARAMS, so later runs memory-map it instead of redoing the work.
+    Its traffic cube is built here, once, and attached to the frame.
+    rent_fallback is passed to get_neighborhoods
+    """
+    if use_store:
+        with span('feature_store.load'):
+            params = dict(PREP_PARAMS, rent_fallback=rent_fallback) if rent_fallback else PREP_PARAMS
+            key = feature_store.cache_key(fetch_sources(pedestrian_url, neighborhoods_url, offline), params)
+            stored = feature_store.load(key)
+        if stored is not None:
+            with span('traffic_cube'):
+                attach_cube(stored)
+            return stored
+
+    df = get_neighborhoods(pedestrian_url, neighborhoods_url, offline, rent_fallback)
+    with span('preprocess'):
+        filtered_df = preprocess(df, **PREP_PARAMS)
+    if use_store:
+        with span('feature_store.save'):
+            feature_store.save(filtered_df, key)
     return filtered_df
 
-# Optimize model
-def optimize_coffee_shops(df, day='May07'):
-    """Optimize coffee shop locations for maximum daily profit"""
-    
-    # Parameters
-    shop_size = 1000  # sqft
-    profit_per_customer = 5  # $
-    staff_per_shift = 2
-    staff_cost_per_shift = 80 * staff_per_shift
-    electricity_cost = 0.125  # $ per sqft per day
-    conversion_rates = {'AM': 0.08, 'MD': 0.08, 'PM': 0.08}
-    
-    # Select candidate locations
-    time_cols = [f'{day}_{t}' for t in ['AM', 'MD', 'PM']]
-    candidate_locs = df.groupby('Loc')[time_cols + ['rent_per_sqft_daily']].mean().copy()
+
+def preprocess(df, lower_quantile=0.05, upper_quantile=0.95, days_per_month=30):
+    """
+    Derive daily totals, drop incomplete rows and traffic outliers, and
+    attach the traffic cube of the result
+    """
+    cube = traffic_cube(df)
+    totals = cube.totals()[cube.locations.get_indexer(df['Loc'])]
+
+    # Clean data: daily_avg is NaN unless every survey is complete
+    daily_avg = totals.mean(axis=1)
+
+    # Filter outliers
+    lower_bound, upper_bound = pd.Series(daily_avg).quantile([lower_quantile, upper_quantile])
+    keep = (daily_avg >= lower_bound) & (daily_avg <= upper_bound)
+
+    # Derived columns for the kept rows: daily totals, their average and
+    # the monthly rent converted to daily
+    rows = np.flatnonzero(keep)
+    derived = {f"{s}_total": totals[rows, i] for i, s in enumerate(cube.surveys)}
+    derived['daily_avg'] = daily_avg[rows]
+    derived['rent_per_sqft_daily'] = df['rent_per_sqft'].to_numpy()[rows] / days_per_month
+
+    # The kept rows are copied once and the frame is assembled in one step
+    filtered = pd.concat([df.take(rows), pd.DataFrame(derived, index=df.index[rows])], axis=1)
+    attach_cube(filtered)
+    return filtered
+
+# Parameters
+SHOP_SIZE = 1000  # sqft
+PROFIT_PER_CUSTOMER = 5  # $
+STAFF_PER_SHIFT = 2
+STAFF_WAGE = 20  # $ per hour
+SHIFT_HOURS = 4
+ELECTRICITY_COST = 0.125  # $ per sqft per day
+CONVERSION_RATES = {'AM': 0.08, 'MD': 0.08, 'PM': 0.08}
+MIN_DAILY_PROFIT = 500  # $
+
+# Every valid schedule: the shop operates during at least 2 of the 3 periods
+SCHEDULES = np.array([[1, 1, 0],
+                      [1, 0, 1],
+                      [0, 1, 1],
+                      [1, 1, 1]], dtype=bool)
+
+# Label of every on/off combination of the periods, e.g. "AM, PM", indexed
+# by its bit code (AM = 1, MD = 2, PM = 4), see operating_labels
+PERIOD_BITS = 1 << np.arange(len(PERIODS))
+OPERATING_LABELS = np.array([', '.join(t for t, bit in zip(PERIODS, PERIOD_BITS) if code & bit)
+                             for code in range(1 << len(PERIODS))])
+
+
+def model_params(shop_size=SHOP_SIZE, conversion_rates=None, staff_wage=STAFF_WAGE,
+                 profit_per_customer=PROFIT_PER_CUSTOMER, staff_per_shift=STAFF_PER_SHIFT,
+                 electricity_cost=ELECTRICITY_COST, min_daily_profit=MIN_DAILY_PROFIT,
+                 min_spacing=None):
+    """
+    Model parameters, defaulting to the constants above. conversion_rates
+    may be one rate for every period or a dict keyed by period. min_spacing
+    (metres) keeps open shops at least that far apart
+    """
+    if conversion_rates is None:
+        conversion_rates = CONVERSION_RATES
+    elif not isinstance(conversion_rates, dict):
+        conversion_rates = {t: conversion_rates for t in PERIODS}
+    return {
+        'shop_size': shop_size,
+        'conversion_rates': dict(conversion_rates),
+        'profit_per_customer': profit_per_customer,
+        'staff_cost_per_shift': staff_wage * SHIFT_HOURS * staff_per_shift,
+        'electricity_cost': electricity_cost,
+        'min_daily_profit': min_daily_profit,
+        'min_spacing': min_spacing,
+    }
+
+
+def select_candidates(df, day='May07'):
+    """
+    Average traffic and daily rent per location for one survey day, sliced
+    from the frame's traffic cube
+    """
+    cube = traffic_cube(df)
+    time_cols = [f'{day}_{t}' for t in PERIODS]
+    candidate_locs = pd.DataFrame(cube.survey(day), columns=time_cols, index=cube.locations)
+    for col in ['rent_per_sqft_daily', 'latitude', 'longitude']:
+        if col in cube.static:
+            candidate_locs[col] = cube.static[col]
     candidate_locs.dropna(subset=time_cols + ['rent_per_sqft_daily'], inplace=True)
-    
-    # Model
+    return candidate_locs
+
+
+def period_margins(candidate_locs, day='May07', params=None):
+    """
+    Profit contributed by operating each period, as a (locations, 3) array,
+    and the daily rent of each location as a (locations,) array
+    """
+    traffic = candidate_locs[[f'{day}_{t}' for t in PERIODS]].to_numpy(dtype=float)
+    return traffic_margins(traffic, candidate_locs['rent_per_sqft_daily'].to_numpy(dtype=float), params)
+
+
+def traffic_margins(traffic, rent_per_sqft_daily, params=None):
+    """period_margins on plain arrays: (n, 3) traffic and (n,) daily rent per sqft"""
+    params = params or model_params()
+    conversion = np.array([params['conversion_rates'][t] for t in PERIODS])
+    revenue = traffic * conversion * params['profit_per_customer']
+    margins = revenue - params['electricity_cost'] * params['shop_size'] - params['staff_cost_per_shift']
+    rent_cost = rent_per_sqft_daily * params['shop_size']
+    return margins, rent_cost
+
+
+def operating_labels(operating):
+    """Labels of (..., 3) boolean operating periods, e.g. 'AM, MD, PM'"""
+    return OPERATING_LABELS[np.asarray(operating).astype(int) @ PERIOD_BITS]
+
+
+def best_schedule(margins, rent_cost):
+    """
+    Most profitable valid schedule of each location, from its (..., 3)
+    period margins and (...,) daily rent. Returns the index into SCHEDULES
+    and the daily profit of that schedule, both shaped like rent_cost
+    """
+    schedule_profit = margins @ SCHEDULES.T - rent_cost[..., None]
+    best = schedule_profit.argmax(axis=-1)
+    return best, np.take_along_axis(schedule_profit, best[..., None], axis=-1)[..., 0]
+
+
+def solve_numpy(candidate_locs, day='May07', params=None):
+    """
+    Solves every location independently by evaluating all valid schedules
+    at once. Returns the open decision (locations,) and the operating
+    periods (locations, 3) as boolean arrays.
+    """
+    params = params or model_params()
+    if params['min_spacing']:
+        raise ValueError("min_spacing couples nearby locations, use the gurobi backend")
+    best, best_profit = best_schedule(*period_margins(candidate_locs, day, params))
+
+    is_open = best_profit >= params['min_daily_profit']
+    operating = SCHEDULES[best] & is_open[:, None]
+    return is_open, operating
+
+
+def build_gurobi_model(candidate_locs, day='May07', params=None):
+    """
+    Builds the location model with the matrix API. Returns the model with
+    the open decision x (locations,) and the operating periods y (locations, 3)
+    """
+    import gurobipy as gp
+    from gurobipy import GRB
+
+    params = params or model_params()
+    margins, rent_cost = period_margins(candidate_locs, day, params)
+    n_locs = len(candidate_locs)
+
     model = gp.Model("CoffeeShopOptimization")
-    x = model.addVars(candidate_locs.index, vtype=GRB.BINARY, name="open_shop")
-    y = model.addVars(candidate_locs.index, ['AM', 'MD', 'PM'], vtype=GRB.BINARY, name="operate_time")
-    
-    # Objective
-    profit = gp.QuadExpr()
-    for loc in candidate_locs.index:
-        rent_cost = x[loc] * candidate_locs.loc[loc, 'rent_per_sqft_daily'] * shop_size
-        utility_cost = electricity_cost * shop_size * gp.quicksum(y[loc,t] for t in ['AM', 'MD', 'PM'])
-        staff_cost = staff_cost_per_shift * gp.quicksum(y[loc,t] for t in ['AM', 'MD', 'PM'])
-        revenue = gp.quicksum(
-            y[loc,t] * conversion_rates[t] * candidate_locs.loc[loc, f'{day}_{t}'] * profit_per_customer
-            for t in ['AM', 'MD', 'PM']
-        )
-        loc_profit = revenue - rent_cost - utility_cost - staff_cost        
-        
-        profit += loc_profit
-    
-    model.setObjective(profit, GRB.MAXIMIZE)
-    
+    x = model.addMVar(n_locs, vtype=GRB.BINARY, name="open_shop")
+    y = model.addMVar((n_locs, len(PERIODS)), vtype=GRB.BINARY, name="operate_time")
+
+    # Objective: per-period margins (revenue - utilities - staff) minus rent
+    loc_profit = (margins * y).sum(axis=1) - rent_cost * x
+    model.setObjective(loc_profit.sum(), GRB.MAXIMIZE)
+
     # Constraints
-    model.addConstrs((y[loc,t] <= x[loc] for loc in candidate_locs.index for t in ['AM', 'MD', 'PM']), 
-                     name="operation_requires_open")
-    model.addConstr(gp.quicksum(x[loc] for loc in candidate_locs.index) >= 1, 
-                    name="open_at_least_one")
-    for loc in candidate_locs.index:
-        model.addConstr(gp.quicksum(y[loc,t] for t in ['AM', 'MD', 'PM']) >= 2 * x[loc],
-                        name=f"min_operating_hours_{loc}")
-    model.addConstr(loc_profit >= 500 * x[loc], name=f"min_profit_{loc}")
-    
-    # Solve
-    model.optimize()
-    
+    model.addConstr(y <= x[:, None], name="operation_requires_open")
+    model.addConstr(y.sum(axis=1) >= 2 * x, name="min_operating_hours")
+    # kept on the model so what-if edits can change its coefficients in place
+    model._min_profit = model.addConstr(loc_profit >= params['min_daily_profit'] * x, name="min_profit")
+
+    # At most one open shop in every clique of locations closer than min_spacing
+    # (one sparse clique x location matrix, added as a single constraint block)
+    if params['min_spacing']:
+        cliques = spacing_cliques(candidate_locs, params['min_spacing'])
+        if cliques:
+            import scipy.sparse as sp
+
+            members = np.concatenate([np.asarray(c, dtype=np.int64) for c in cliques])
+            rows = np.repeat(np.arange(len(cliques)), [len(c) for c in cliques])
+            A = sp.csr_matrix((np.ones(len(members)), (rows, members)), shape=(len(cliques), n_locs))
+            model.addConstr(A @ x <= 1, name="min_spacing")
+    return model, x, y
+
+
+def solve_gurobi(candidate_locs, day='May07', params=None):
+    """Solves the location model as a single Gurobi MILP"""
+    from gurobipy import GRB
+
+    with span('build_model') as build:
+        model, x, y = build_gurobi_model(candidate_locs, day, params)
+        model.update()
+
+    with span('solve') as solve:
+        model.optimize()
+    print(f"Model built in {build['duration']:.3f}s, solved in {solve['duration']:.3f}s "
+          f"({len(candidate_locs)} locations)")
+
+    if model.status != GRB.OPTIMAL:
+        return None
+    return x.X > 0.5, y.X > 0.5
+
+
+# Solver backends by name. Each one imports its solver library when first
+# called, so loading this module never requires gurobipy
+SOLVERS = {
+    'gurobi': solve_gurobi,
+    'numpy': solve_numpy,
+}
+
+
+def register_solver(name):
+    """Decorator adding a solve(candidate_locs, day, params) function to SOLVERS"""
+    def decorator(func):
+        SOLVERS[name] = func
+        return func
+    return decorator
+
+
+def default_backend():
+    """'gurobi' when gurobipy is installed, the NumPy solver otherwise"""
+    return 'gurobi' if importlib.util.find_spec('gurobipy') else 'numpy'
+
+
+def summarize_results(candidate_locs, is_open, operating, day='May07', params=None):
+    """Builds the results table for the open locations clearing the profit floor"""
+    params = params or model_params()
+    shop_size = params['shop_size']
+    traffic = candidate_locs[[f'{day}_{t}' for t in PERIODS]].to_numpy(dtype=float)
+    conversion = np.array([params['conversion_rates'][t] for t in PERIODS])
+    rent_per_sqft_daily = candidate_locs['rent_per_sqft_daily'].to_numpy(dtype=float)
+    n_periods = operating.sum(axis=1)
+
+    customers = (operating * conversion * traffic).sum(axis=1)
+    revenue = customers * params['profit_per_customer']
+    rent_cost = rent_per_sqft_daily * shop_size
+    staff_cost = params['staff_cost_per_shift'] * n_periods
+    utility_cost = params['electricity_cost'] * shop_size * n_periods
+    daily_profit = revenue - rent_cost - staff_cost - utility_cost
+
+    # Only include results with >= $500 profit
+    keep = is_open & (daily_profit >= params['min_daily_profit'])
+
+    results_df = pd.DataFrame({
+        'Location': candidate_locs.index[keep],
+        'Rent ($/sqft monthly)': rent_per_sqft_daily[keep] * 30,
+        'Daily Rent': rent_cost[keep],
+        'Daily Staff': staff_cost[keep],
+        'Daily Utilities': utility_cost[keep],
+        'Operating Times': operating_labels(operating[keep]),
+        'Daily Customers': customers[keep].astype(int),
+        'Daily Revenue': revenue[keep],
+        'Daily Profit': daily_profit[keep],
+        'AM Traffic': traffic[keep, 0].astype(int),
+        'MD Traffic': traffic[keep, 1].astype(int),
+        'PM Traffic': traffic[keep, 2].astype(int),
+    })
+    return results_df.sort_values('Daily Profit', ascending=False).round(2)
+
+
+# Optimize model
+@timed('optimize_coffee_shops')
+def optimize_coffee_shops(df, day='May07', backend=None, **params):
+    """
+    Optimize coffee shop locations for maximum daily profit
+
+    backend selects the solver: 'gurobi' solves one MILP for the whole city,
+    'numpy' solves each location independently (the model is separable).
+    The default is gurobi when it is installed. Keyword arguments override the model parameters, see model_params
+    """
+    params = model_params(**params)
+    backend = backend or default_backend()
+    if backend not in SOLVERS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {sorted(SOLVERS)}")
+
+    with span('select_candidates'):
+        candidate_locs = select_candidates(df, day)
+    with span(f'solve_{backend}'):
+        solution = SOLVERS[backend](candidate_locs, day, params)
+
     # Results
-    if model.status == GRB.OPTIMAL:
-        results = []
-        for loc in candidate_locs.index:
-            if x[loc].X > 0.5:
-                operating_times = [t for t in ['AM', 'MD', 'PM'] if y[loc,t].X > 0.5]
-                
-                traffic = {t: candidate_locs.loc[loc, f'{day}_{t}'] for t in ['AM', 'MD', 'PM']}
-                customers = sum(conversion_rates[t] * traffic[t] for t in operating_times)
-                revenue = customers * profit_per_customer
-                rent_cost = candidate_locs.loc[loc, 'rent_per_sqft_daily'] * shop_size
-                staff_cost = staff_cost_per_shift * len(operating_times)
-                utility_cost = electricity_cost * shop_size * len(operating_times)
-                
-                daily_profit = revenue - rent_cost - staff_cost - utility_cost
-                
-                # Only include results with >= $500 profit
-                if daily_profit >= 500:
-                    results.append({
-                        'Location': loc,
-                        'Rent ($/sqft monthly)': candidate_locs.loc[loc, 'rent_per_sqft_daily'] * 30,
-                        'Daily Rent': rent_cost,
-                        'Daily Staff': staff_cost,
-                        'Daily Utilities': utility_cost,
-                        'Operating Times': ', '.join(operating_times),
-                        'Daily Customers': int(customers),
-                        'Daily Revenue': revenue,
-                        'Daily Profit': daily_profit,
-                        'AM Traffic': int(traffic['AM']),
-                        'MD Traffic': int(traffic['MD']),
-                        'PM Traffic': int(traffic['PM'])
-                    })
-
-        results_df = pd.DataFrame(results).sort_values('Daily Profit', ascending=False)
-        return results_df.round(2)
+    if solution is not None:
+        is_open, operating = solution
+        with span('summarize_results'):
+            return summarize_results(candidate_locs, is_open, operating, day, params)
     else:
         print("No optimal solution found.")
         return None
@@ -125,10 +329,14 @@ def optimize_coffee_shops(df, day='May07'):
 # Solve model 
 
 if __name__ == "__main__":
-    pedestrian_url = "https://gist.githubusercontent.com/JoshBong/d83569f9837962d98b2c16d2312ed2d2/raw"
-    neighborhoods_url = "https://gist.githubusercontent.com/JoshBong/5e6697ffa29f3db776254188a5aea8fb/raw/6621a3cf7fcde270097be79a1b5fe5c5716ae618/gistfile1.txt"
-    
-    df_processed = prepare_data(pedestrian_url, neighborhoods_url)
+    parser = argparse.ArgumentParser(description="Optimize coffee shop locations")
+    parser.add_argument('--offline', action='store_true',
+                        help="read the local data files instead of downloading the gists")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    df_processed = prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline)
     
     avg_by_location = df_processed.groupby('Loc')['daily_avg'].mean().sort_values(ascending=False)
     print("Average daily pedestrian count per location:\n")
@@ -165,3 +373,4 @@ if __name__ == "__main__":
         print(f"   Daily Customers: {worst_loc['Daily Customers']}")
         print(f"   Daily Revenue: ${worst_loc['Daily Revenue']:,.2f}")
 
+    finish_profiling(args)
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Renderers by name. Like the solver backends in optimization.SOLVERS, each
+# one imports its drawing library when first called, so choosing or listing
+# renderers never loads folium
+RENDERERS = {}
+
+
+def register_renderer(name):
+    '''
+    decorator adding a render(locations, results, output_file=None, **options)
+    function to RENDERERS. locations has Loc, latitude and longitude per
+    counting site, results is the optimize_coffee_shops table
+    '''
+    def decorator(func):
+        RENDERERS[name] = func
+        return func
+    return decorator
+
+
+def render(name, locations, results, output_file=None, **options):
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown renderer {name!r}, expected one of {sorted(RENDERERS)}")
+    return RENDERERS[name](locations, results, output_file, **options)
+
+
+@register_renderer('folium')
+def render_folium(locations, results, output_file=None, mode='markers'):
+    '''
+    interactive html map, see map.create_map
+    '''
+    from map import create_map
+
+    create_map(locations, set(results['Location']), profit_data=results,
+               output_file=output_file or "coffee_shop_locations.html", mode=mode)
+
+
+@register_renderer('geojson')
+def render_geojson(locations, results, output_file=None):
+    '''
+    one GeoJSON point per counting site, with its rent and, for the
+    profitable ones, the results columns as properties
+    '''
+    output_file = output_file or "coffee_shop_locations.geojson"
+    sites = locations.drop_duplicates('Loc')[['Loc', 'latitude', 'longitude', 'rent_per_sqft']]
+    merged = sites.merge(results.rename(columns={'Location': 'Loc'}), on='Loc', how='left')
+    profitable = merged['Loc'].isin(results['Location']).to_numpy()
+
+    properties = merged.drop(columns=['latitude', 'longitude'])
+    records = properties.astype(object).where(properties.notna(), None).to_dict('records')
+    features = [{
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+        'properties': {k: (v.item() if isinstance(v, np.generic) else v)
+                       for k, v in dict(record, profitable=bool(flag)).items() if v is not None},
+    } for lat, lon, record, flag in zip(merged['latitude'], merged['longitude'], records, profitable)
+        if pd.notna(lat) and pd.notna(lon)]
+
+    with open(output_file, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+    print(f"{len(features)} sites ({int(profitable.sum())} profitable) saved to {output_file}")
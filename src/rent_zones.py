@@ -0,0 +1,246 @@
+import numpy as np
+
+from spacing import METERS_PER_DEGREE
+
+# Rent fallbacks for points outside every zone
+FALLBACKS = ('nearest', 'idw')
+
+# Bound on points x zones distances held in memory by the fallback
+FALLBACK_CELLS = 5_000_000
+
+
+class ZoneIndex:
+    '''
+    rent lookup shared by the zone indexes, which provide query() (first
+    containing zone or -1), matches() (every containing zone) and
+    distances() (metres to every zone)
+    '''
+
+    def rents(self, lat, lon, fallback=None, k=3, max_distance=None):
+        '''
+        returns the rent of the first zone containing each point. points
+        outside every zone get NaN, or a rent from the nearby zones when
+        fallback is given, see fallback_rents
+        '''
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        zone = self.query(lat, lon)
+        rent = np.where(zone >= 0, self.rent[np.maximum(zone, 0)], np.nan)
+        missing = np.flatnonzero(zone < 0)
+        if fallback is not None and len(missing):
+            rent[missing] = self.fallback_rents(lat[missing], lon[missing], fallback, k, max_distance)
+        return rent
+
+    def fallback_rents(self, lat, lon, method='nearest', k=3, max_distance=None):
+        '''
+        rent for points from the zones around them: the closest zone's rent
+        ('nearest') or the inverse-square-distance weighted rent of the k
+        closest zones ('idw'). NaN where the closest zone is further than
+        max_distance metres
+        '''
+        if method not in FALLBACKS:
+            raise ValueError(f"Unknown rent fallback {method!r}, expected one of {FALLBACKS}")
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        n_zones = len(self.rent)
+        rent = np.full(len(lat), np.nan)
+        if n_zones == 0:
+            return rent
+
+        n_nearest = 1 if method == 'nearest' else min(k, n_zones)
+        step = max(1, FALLBACK_CELLS // n_zones)
+        for start in range(0, len(lat), step):
+            stop = start + step
+            distance = self.distances(lat[start:stop], lon[start:stop])
+            nearest = np.argpartition(distance, n_nearest - 1, axis=1)[:, :n_nearest]
+            distance = np.take_along_axis(distance, nearest, axis=1)
+            weights = 1.0 / np.maximum(distance, 1.0) ** 2
+            values = (self.rent[nearest] * weights).sum(axis=1) / weights.sum(axis=1)
+            if max_distance is not None:
+                values = np.where(distance.min(axis=1) <= max_distance, values, np.nan)
+            rent[start:stop] = values
+        return rent
+
+
+class BoxZoneIndex(ZoneIndex):
+    '''
+    grid-bucketed index over lat/lon bounding boxes
+
+    every grid cell keeps the zones whose box overlaps it, in the order the
+    zones were given, so a lookup only tests the few boxes in the point's
+    cell and still returns the first matching zone
+    '''
+
+    def __init__(self, neighborhoods, cell_size=0.01, chunk_size=500_000):
+        self.names = list(neighborhoods)
+        zones = list(neighborhoods.values())
+        self.lat_min = np.array([z['lat_min'] for z in zones], dtype=float)
+        self.lat_max = np.array([z['lat_max'] for z in zones], dtype=float)
+        self.lon_min = np.array([z['lon_min'] for z in zones], dtype=float)
+        self.lon_max = np.array([z['lon_max'] for z in zones], dtype=float)
+        self.rent = np.array([z['rent'] for z in zones], dtype=float)
+        # longitude scale for distances, fixed so every point is measured alike
+        self.ref_lat = float(((self.lat_min + self.lat_max) / 2).mean()) if zones else 0.0
+        self.cell_size = cell_size
+        self.chunk_size = chunk_size
+
+        self.lat0 = self.lat_min.min() if zones else 0.0
+        self.lon0 = self.lon_min.min() if zones else 0.0
+        self.n_rows = int(self._cell(self.lat_max.max(), self.lat0)) + 1 if zones else 1
+        self.n_cols = int(self._cell(self.lon_max.max(), self.lon0)) + 1 if zones else 1
+
+        buckets = [[] for _ in range(self.n_rows * self.n_cols)]
+        for zone in range(len(zones)):
+            rows = range(int(self._cell(self.lat_min[zone], self.lat0)),
+                         int(self._cell(self.lat_max[zone], self.lat0)) + 1)
+            cols = range(int(self._cell(self.lon_min[zone], self.lon0)),
+                         int(self._cell(self.lon_max[zone], self.lon0)) + 1)
+            for row in rows:
+                for col in cols:
+                    buckets[row * self.n_cols + col].append(zone)
+
+        # pad the buckets into one (cells, max zones per cell) array, -1 = empty
+        width = max((len(b) for b in buckets), default=0) or 1
+        self.buckets = np.full((len(buckets), width), -1, dtype=np.int64)
+        for cell, bucket in enumerate(buckets):
+            self.buckets[cell, :len(bucket)] = bucket
+
+    def _cell(self, value, origin):
+        return np.floor((np.asarray(value, dtype=float) - origin) / self.cell_size)
+
+    def query(self, lat, lon):
+        '''
+        returns the index of the first zone containing each point, -1 if none
+        '''
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        result = np.full(lat.shape, -1, dtype=np.int64)
+        for start in range(0, len(lat), self.chunk_size):
+            stop = start + self.chunk_size
+            result[start:stop] = self._query_chunk(lat[start:stop], lon[start:stop])
+        return result
+
+    def matches(self, lat, lon):
+        '''
+        every zone containing each point, as (point, zone) index arrays
+        ordered by point and then zone
+        '''
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        points, zones = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for start in range(0, len(lat), self.chunk_size):
+            stop = start + self.chunk_size
+            candidates, inside = self._inside(lat[start:stop], lon[start:stop])
+            point, slot = np.nonzero(inside)
+            points.append(point + start)
+            zones.append(candidates[point, slot])
+        return np.concatenate(points), np.concatenate(zones)
+
+    def _inside(self, lat, lon):
+        '''
+        the candidate zones of each point's cell, (points, width) with -1
+        padding, and whether the point is inside each of them
+        '''
+        row = self._cell(lat, self.lat0)
+        col = self._cell(lon, self.lon0)
+        on_grid = (row >= 0) & (row < self.n_rows) & (col >= 0) & (col < self.n_cols)
+        cell = np.where(on_grid, row * self.n_cols + col, 0).astype(np.int64)
+
+        candidates = self.buckets[cell]
+        zone = np.maximum(candidates, 0)
+        inside = ((candidates >= 0) & on_grid[:, None]
+                  & (self.lat_min[zone] <= lat[:, None]) & (lat[:, None] <= self.lat_max[zone])
+                  & (self.lon_min[zone] <= lon[:, None]) & (lon[:, None] <= self.lon_max[zone]))
+        return candidates, inside
+
+    def _query_chunk(self, lat, lon):
+        candidates, inside = self._inside(lat, lon)
+        first = inside.argmax(axis=1)
+        matched = candidates[np.arange(len(lat)), first]
+        return np.where(inside.any(axis=1), matched, -1)
+
+    def distances(self, lat, lon):
+        '''
+        (points, zones) distance in metres from each point to each box, zero
+        inside
+        '''
+        lat = np.asarray(lat, dtype=float)[:, None]
+        lon = np.asarray(lon, dtype=float)[:, None]
+        d_lat = np.maximum(np.maximum(self.lat_min - lat, lat - self.lat_max), 0)
+        d_lon = np.maximum(np.maximum(self.lon_min - lon, lon - self.lon_max), 0)
+        return np.hypot(d_lat, d_lon * np.cos(np.radians(self.ref_lat))) * METERS_PER_DEGREE
+
+
+class PolygonZoneIndex(ZoneIndex):
+    '''
+    STRtree index over zone polygons
+
+    zones with a "polygon" entry ([[lon, lat], ...]) use that outline, the
+    others fall back to their bounding box. points on a zone's edge count as
+    inside, and the first matching zone wins, like the bounding-box lookup
+    '''
+
+    def __init__(self, neighborhoods):
+        import shapely
+
+        self.names = list(neighborhoods)
+        zones = list(neighborhoods.values())
+        self.rent = np.array([z['rent'] for z in zones], dtype=float)
+        self.geometries = np.array([
+            shapely.Polygon(z['polygon']) if 'polygon' in z
+            else shapely.box(z['lon_min'], z['lat_min'], z['lon_max'], z['lat_max'])
+            for z in zones
+        ])
+        self.tree = shapely.STRtree(self.geometries)
+        bounds = shapely.bounds(self.geometries)
+        self.ref_lat = float(((bounds[:, 1] + bounds[:, 3]) / 2).mean()) if zones else 0.0
+
+    def query(self, lat, lon):
+        '''
+        returns the index of the first zone containing each point, -1 if none
+        '''
+        import shapely
+
+        pts = shapely.points(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+        point_idx, zone_idx = self.tree.query(pts, predicate='intersects')
+
+        n_zones = len(self.geometries)
+        first = np.full(len(pts), n_zones, dtype=np.int64)
+        np.minimum.at(first, point_idx, zone_idx)
+        return np.where(first < n_zones, first, -1)
+
+    def matches(self, lat, lon):
+        '''
+        every zone containing each point, as (point, zone) index arrays
+        ordered by point and then zone
+        '''
+        import shapely
+
+        pts = shapely.points(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+        point_idx, zone_idx = self.tree.query(pts, predicate='intersects')
+        order = np.lexsort((zone_idx, point_idx))
+        return point_idx[order], zone_idx[order]
+
+    def distances(self, lat, lon):
+        '''
+        (points, zones) distance in metres from each point to each outline,
+        zero inside
+        '''
+        import shapely
+
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        scale = np.cos(np.radians(self.ref_lat))
+        geometries = shapely.transform(self.geometries, lambda coords: coords * [scale, 1.0])
+        pts = shapely.points(lon * scale, lat)
+        return shapely.distance(pts[:, None], geometries[None, :]) * METERS_PER_DEGREE
+
+
+def zone_index(neighborhoods):
+    '''
+    picks the index for the zone data: the STRtree when any zone has a real
+    polygon outline, the bounding-box grid otherwise
+    '''
+    if any('polygon' in z for z in neighborhoods.values()):
+        return PolygonZoneIndex(neighborhoods)
+    return BoxZoneIndex(neighborhoods)
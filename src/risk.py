@@ -0,0 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from optimization import PERIODS, SCHEDULES, best_schedule, model_params, period_margins, select_candidates
+from traffic import traffic_cube
+
+N_BINS = 2000
+
+
+def traffic_volatility(df, locations):
+    '''
+    survey-to-survey spread of each location's counts, as the standard
+    deviation of log counts per (location, period). zero where fewer than
+    two positive counts were observed
+    '''
+    cube = traffic_cube(df)
+    counts = cube.counts[cube.locations.get_indexer(locations)]
+    positive = counts > 0
+    logs = np.log(np.where(positive, counts, 1.0))
+    observed = positive.sum(axis=1)
+    mean = np.where(positive, logs, 0).sum(axis=1) / np.maximum(observed, 1)
+    sq_dev = np.where(positive, (logs - mean[:, None, :]) ** 2, 0).sum(axis=1)
+    return np.where(observed >= 2, np.sqrt(sq_dev / np.maximum(observed - 1, 1)), 0.0)
+
+
+class _Model:
+    '''
+    everything a worker needs to draw profits: base traffic, its noise,
+    the fixed schedule of each location and the cost terms
+    '''
+
+    def __init__(self, traffic, sigma, schedule, rent_cost, fixed_cost, params,
+                 conversion_sd, margin_sd):
+        self.traffic = traffic
+        self.sigma = sigma
+        self.schedule = schedule
+        self.rent_cost = rent_cost
+        self.fixed_cost = fixed_cost
+        self.conversion = np.array([params['conversion_rates'][t] for t in PERIODS])
+        self.margin = params['profit_per_customer']
+        self.conversion_sd = conversion_sd
+        self.margin_sd = margin_sd
+
+    def draw(self, rng, n):
+        '''
+        (n, locations) daily profits. conversion and margin shocks are shared
+        by every location in a draw, traffic noise is per location and period
+        '''
+        conversion = np.clip(self.conversion + rng.normal(0, self.conversion_sd, (n, 1)), 0, 1)
+        margin = np.maximum(self.margin + rng.normal(0, self.margin_sd, (n, 1)), 0)
+        noise = rng.standard_normal((n,) + self.traffic.shape) * self.sigma
+        # mean-preserving lognormal noise around the survey counts
+        traffic = self.traffic * np.exp(noise - self.sigma ** 2 / 2)
+        customers = (traffic * self.schedule * conversion[:, None, :]).sum(axis=2)
+        return customers * margin - self.fixed_cost - self.rent_cost
+
+
+def _accumulate(model, edges, n_draws, chunk_size, seed, target):
+    '''
+    runs n_draws in chunks of chunk_size and returns running totals only,
+    so memory does not grow with n_draws
+    '''
+    rng = np.random.default_rng(seed)
+    n_locs = model.traffic.shape[0]
+    lo, width = edges
+    hist = np.zeros(n_locs * N_BINS, dtype=np.int64)
+    totals = {'n': 0, 'hits': np.zeros(n_locs), 'sum': np.zeros(n_locs),
+              'sum_sq': np.zeros(n_locs), 'rank_sum': np.zeros(n_locs)}
+    offsets = np.arange(n_locs) * N_BINS
+
+    for start in range(0, n_draws, chunk_size):
+        profit = model.draw(rng, min(chunk_size, n_draws - start))
+        totals['n'] += len(profit)
+        totals['hits'] += (profit >= target).sum(axis=0)
+        totals['sum'] += profit.sum(axis=0)
+        totals['sum_sq'] += (profit ** 2).sum(axis=0)
+        # rank 1 = most profitable location in that draw
+        totals['rank_sum'] += (-profit).argsort(axis=1).argsort(axis=1).sum(axis=0) + len(profit)
+
+        bins = np.clip(((profit - lo) / width).astype(np.int64), 0, N_BINS - 1)
+        hist += np.bincount((bins + offsets).ravel(), minlength=hist.size)
+
+    totals['hist'] = hist.reshape(n_locs, N_BINS)
+    return totals
+
+
+def _histogram_quantiles(hist, lo, width, quantiles):
+    '''
+    quantiles read off the per-location histograms, interpolated within bins
+    '''
+    cdf = hist.cumsum(axis=1)
+    n = cdf[:, -1:]
+    out = np.empty((hist.shape[0], len(quantiles)))
+    lo, width = np.broadcast_to(lo, hist.shape[:1]), np.broadcast_to(width, hist.shape[:1])
+    for j, q in enumerate(quantiles):
+        target = q * n
+        b = (cdf < target).sum(axis=1)
+        b = np.minimum(b, hist.shape[1] - 1)
+        before = np.where(b > 0, np.take_along_axis(cdf, np.maximum(b - 1, 0)[:, None], axis=1), 0)
+        in_bin = np.take_along_axis(hist, b[:, None], axis=1)
+        frac = np.where(in_bin > 0, (target - before) / np.maximum(in_bin, 1), 0.5)
+        out[:, j] = lo + (b + frac[:, 0]) * width
+    return out
+
+
+def simulate_profit_risk(df, day='May07', n_draws=100_000, chunk_size=2_000, processes=None,
+                         conversion_sd=0.02, margin_sd=1.0, quantiles=(0.05, 0.5, 0.95),
+                         seed=0, **params):
+    '''
+    Monte Carlo daily profit of every candidate location
+
+    each location keeps its best schedule under the base parameters. every
+    draw perturbs the conversion rates and the margin per customer (shared
+    across locations) and the traffic of each location and period, with
+    lognormal noise sized by that location's survey-to-survey spread
+
+    draws are processed in chunks of chunk_size, optionally split across
+    `processes` workers, and only running totals and fixed-size histograms
+    are kept, so memory is bounded by chunk_size x locations
+
+    returns one row per location with P(profit >= floor), mean profit,
+    profit quantiles and expected rank
+    '''
+    params = model_params(**params)
+    candidate_locs = select_candidates(df, day)
+    margins, rent_cost = period_margins(candidate_locs, day, params)
+    schedule = SCHEDULES[best_schedule(margins, rent_cost)[0]]
+
+    traffic = candidate_locs[[f'{day}_{t}' for t in PERIODS]].to_numpy(dtype=float)
+    per_period = params['electricity_cost'] * params['shop_size'] + params['staff_cost_per_shift']
+    model = _Model(traffic, traffic_volatility(df, candidate_locs.index), schedule,
+                   rent_cost, schedule.sum(axis=1) * per_period, params, conversion_sd, margin_sd)
+    target = params['min_daily_profit']
+
+    # per-location histogram ranges from a pilot run, wide enough for the tails
+    pilot = model.draw(np.random.default_rng([seed, 1]), min(chunk_size, 2_000))
+    spread = np.maximum(pilot.std(axis=0), 1.0)
+    lo = pilot.min(axis=0) - 4 * spread
+    width = (pilot.max(axis=0) + 4 * spread - lo) / N_BINS
+
+    seeds = np.random.SeedSequence(seed).spawn(processes or 1)
+    shares = [n_draws // len(seeds) + (i < n_draws % len(seeds)) for i in range(len(seeds))]
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = list(pool.map(_accumulate, [model] * len(seeds), [(lo, width)] * len(seeds),
+                                  shares, [chunk_size] * len(seeds), seeds, [target] * len(seeds)))
+    else:
+        parts = [_accumulate(model, (lo, width), shares[0], chunk_size, seeds[0], target)]
+
+    n = sum(p['n'] for p in parts)
+    merged = {key: sum(p[key] for p in parts) for key in ['hits', 'sum', 'sum_sq', 'rank_sum', 'hist']}
+    mean = merged['sum'] / n
+    risk = pd.DataFrame({
+        'Location': candidate_locs.index,
+        f'P(Profit >= {target:g})': merged['hits'] / n,
+        'Mean Profit': mean,
+        'Profit Std': np.sqrt(np.maximum(merged['sum_sq'] / n - mean ** 2, 0)),
+    })
+    for q, values in zip(quantiles, _histogram_quantiles(merged['hist'], lo, width, quantiles).T):
+        risk[f'Profit P{q * 100:g}'] = values
+    risk['Expected Rank'] = merged['rank_sum'] / n
+    return risk.sort_values('Expected Rank').round(4)
+
+
+def add_risk_columns(results, risk):
+    '''
+    merges simulate_profit_risk output into an optimize_coffee_shops results
+    frame, keeping its order
+    '''
+    return results.merge(risk.drop(columns='Mean Profit'), on='Location', how='left')
@@ -0,0 +1,156 @@
+import time
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+import pandas as pd
+
+from optimization import best_schedule, model_params, period_margins, select_candidates
+from scenarios import survey_days
+
+
+def scenario_profits(df, days=None, params=None):
+    '''
+    best-schedule daily profit of every location in every survey period,
+    as a (scenarios, locations) array. locations missing counts in any of
+    the periods are left out
+
+    returns the array, the survey days and the location ids
+    '''
+    params = params or model_params()
+    days = days or survey_days(df)
+    profits = {}
+    for day in days:
+        candidate_locs = select_candidates(df, day)
+        _, best = best_schedule(*period_margins(candidate_locs, day, params))
+        profits[day] = pd.Series(best, index=candidate_locs.index)
+    table = pd.DataFrame(profits).dropna()
+    return table.to_numpy().T, list(table.columns), table.index
+
+
+def robust_portfolio(df, k=10, rent_budget=None, days=None, verbose=False, **params):
+    '''
+    picks at most k shops maximizing the worst daily profit over the survey
+    periods, as in the hw4 max-min model
+
+    rent_budget caps the combined daily rent of the chosen shops. scenario
+    constraints (min_profit <= profit in scenario s) are added lazily: the
+    model starts with the weakest scenario and a callback adds whichever
+    scenario a new incumbent violates most, so only binding scenarios are
+    ever in the model
+
+    returns the selected locations and a summary dict, or None
+    '''
+    params = model_params(**params)
+    profits, days, locations = scenario_profits(df, days, params)
+    n_scenarios, n_locs = profits.shape
+    rent_cost = select_candidates(df, days[0]).loc[locations, 'rent_per_sqft_daily'].to_numpy() \
+        * params['shop_size']
+
+    start = time.perf_counter()
+    model = gp.Model('robust_portfolio')
+    model.Params.OutputFlag = 1 if verbose else 0
+    model.Params.LazyConstraints = 1
+
+    # binary variable to pick shops, placeholder for the min profit
+    x = model.addVars(n_locs, vtype=GRB.BINARY, name='open_shop')
+    y = model.addVar(lb=-GRB.INFINITY, name='min_profit')
+    x_list = [x[i] for i in range(n_locs)]
+
+    # start from the scenario that is worst on average
+    weakest = int(profits.mean(axis=1).argmin())
+    active = {weakest}
+    model.addConstr(y <= gp.LinExpr(profits[weakest], x_list), name=f'scenario_{days[weakest]}')
+
+    # overall constraints
+    model.addConstr(gp.quicksum(x_list) <= k, name='max_shops')
+    model.addConstr(gp.quicksum(x_list) >= 1, name='min_shops')
+    if rent_budget is not None:
+        model.addConstr(gp.LinExpr(rent_cost, x_list) <= rent_budget, name='rent_budget')
+
+    model.setObjective(y, GRB.MAXIMIZE)
+
+    def add_violated(model, where):
+        if where != GRB.Callback.MIPSOL:
+            return
+        chosen = np.array(model.cbGetSolution(x_list))
+        bound = model.cbGetSolution(y)
+        portfolio = profits @ chosen
+        worst = int(portfolio.argmin())
+        if portfolio[worst] < bound - 1e-6:
+            active.add(worst)
+            model.cbLazy(y <= gp.LinExpr(profits[worst], x_list))
+
+    model.optimize(add_violated)
+    solve_time = time.perf_counter() - start
+
+    if model.status != GRB.OPTIMAL:
+        print(f"Optimization terminated with status: {model.status}")
+        return None
+
+    chosen = np.array([x[i].X > 0.5 for i in range(n_locs)])
+    portfolio = profits[:, chosen]
+    selected = pd.DataFrame({
+        'Location': locations[chosen],
+        'Daily Rent': rent_cost[chosen],
+        'Mean Profit': portfolio.mean(axis=0),
+        'Worst Profit': portfolio.min(axis=0),
+    }).sort_values('Worst Profit', ascending=False).round(2)
+
+    totals = portfolio.sum(axis=1)
+    summary = {
+        'worst_case_profit': float(totals.min()),
+        'worst_scenario': days[int(totals.argmin())],
+        'mean_profit': float(totals.mean()),
+        'scenarios': n_scenarios,
+        'binding_scenarios': sorted(days[s] for s in active),
+        'solve_time': solve_time,
+    }
+    return selected, summary
+
+
+def scaling_report(df, k=10, rent_budget=None, scenario_counts=None, **params):
+    '''
+    solve time of robust_portfolio against the number of survey periods used
+    '''
+    days = survey_days(df)
+    rows = []
+    for count in scenario_counts or range(4, len(days) + 1, 4):
+        result = robust_portfolio(df, k, rent_budget, days=days[:count], **params)
+        if result is None:
+            continue
+        _, summary = result
+        rows.append({
+            'Scenarios': summary['scenarios'],
+            'Binding Scenarios': len(summary['binding_scenarios']),
+            'Worst-case Profit': summary['worst_case_profit'],
+            'Solve Time (s)': summary['solve_time'],
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL
+    from optimization import prepare_data
+
+    parser = argparse.ArgumentParser(description="Pick the shops with the best worst-case profit")
+    parser.add_argument('-k', type=int, default=10, help="maximum number of shops")
+    parser.add_argument('--rent-budget', type=float, default=None, help="combined daily rent cap ($)")
+    parser.add_argument('--offline', action='store_true',
+                        help="read the local data files instead of downloading the gists")
+    args = parser.parse_args()
+
+    df_processed = prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline)
+    result = robust_portfolio(df_processed, k=args.k, rent_budget=args.rent_budget)
+    if result is None:
+        print("No feasible portfolio, try a larger --rent-budget")
+    else:
+        selected, summary = result
+        print("Selected Locations:\n")
+        print(selected.to_string(index=False))
+        print(f"\nWorst Case Daily Profit (Maximin): ${summary['worst_case_profit']:,.2f} "
+              f"in {summary['worst_scenario']}")
+        print(f"Binding scenarios: {len(summary['binding_scenarios'])} of {summary['scenarios']}")
+        print("\nSolve time by scenario count:\n")
+        print(scaling_report(df_processed, args.k, args.rent_budget).to_string(index=False))
@@ -0,0 +1,105 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from optimization import (SCHEDULES, STAFF_WAGE, best_schedule, model_params, optimize_coffee_shops,
+                          period_margins, select_candidates, summarize_results)
+from traffic import traffic_cube
+
+SCENARIO_COLS = ['Scenario', 'Day', 'Shop Size', 'Conversion Rate', 'Staff Wage']
+
+
+def survey_days(df):
+    """Survey periods in date order"""
+    return traffic_cube(df).surveys
+
+
+def scenario_grid(days, shop_sizes, conversion_rates, staff_wages):
+    """One row per day x shop size x conversion rate x wage combination"""
+    grid = pd.DataFrame(
+        list(itertools.product(days, shop_sizes, conversion_rates, staff_wages)),
+        columns=SCENARIO_COLS[1:],
+    )
+    grid.insert(0, 'Scenario', np.arange(len(grid)))
+    return grid
+
+
+def _scenario_kwargs(scenario):
+    return dict(shop_size=scenario['Shop Size'],
+                conversion_rates=scenario['Conversion Rate'],
+                staff_wage=scenario['Staff Wage'])
+
+
+def _solve_day(candidate_locs, day, scenarios):
+    """
+    Solves every scenario of one survey day in one array operation: the
+    schedule profits of all scenarios are stacked into a
+    (scenarios, locations, schedules) array
+    """
+    params = [model_params(**_scenario_kwargs(s)) for s in scenarios]
+    margins, rent_cost = zip(*(period_margins(candidate_locs, day, p) for p in params))
+    margins, rent_cost = np.stack(margins), np.stack(rent_cost)
+    floors = np.array([p['min_daily_profit'] for p in params])
+
+    best, best_profit = best_schedule(margins, rent_cost)
+    is_open = best_profit >= floors[:, None]
+    operating = SCHEDULES[best] & is_open[:, :, None]
+
+    return [summarize_results(candidate_locs, is_open[i], operating[i], day, p)
+            for i, p in enumerate(params)]
+
+
+# Each pool worker receives the data once instead of once per scenario
+_worker_df = None
+
+
+def _init_worker(df):
+    global _worker_df
+    _worker_df = df
+
+
+def _run_scenario(scenario, backend):
+    return optimize_coffee_shops(_worker_df, day=scenario['Day'], backend=backend,
+                                 **_scenario_kwargs(scenario))
+
+
+def sweep_scenarios(df, days=None, shop_sizes=(600, 800, 1000), conversion_rates=(0.08,),
+                    staff_wages=(STAFF_WAGE,), backend='numpy', processes=None):
+    """
+    Optimize every day x shop size x conversion rate x wage scenario
+
+    With the numpy backend and no processes, each day's scenarios are
+    solved together as one vectorized evaluation. Otherwise every scenario
+    runs optimize_coffee_shops on a pool of `processes` workers.
+
+    Returns one frame with the scenario columns, the usual results columns
+    and each location's Rank by daily profit within its scenario
+    """
+    grid = scenario_grid(days or survey_days(df), shop_sizes, conversion_rates, staff_wages)
+    scenarios = grid.to_dict('records')
+
+    if backend == 'numpy' and processes is None:
+        results = []
+        for day, day_scenarios in itertools.groupby(scenarios, key=lambda s: s['Day']):
+            day_scenarios = list(day_scenarios)
+            results.extend(_solve_day(select_candidates(df, day), day, day_scenarios))
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(df,)) as pool:
+            results = list(pool.map(_run_scenario, scenarios, itertools.repeat(backend)))
+
+    frames = []
+    for scenario, result in zip(scenarios, results):
+        if result is None or result.empty:
+            continue
+        result = result.reset_index(drop=True)
+        result.insert(0, 'Rank', np.arange(1, len(result) + 1))
+        for col in reversed(SCENARIO_COLS):
+            result.insert(0, col, scenario[col])
+        frames.append(result)
+
+    if not frames:
+        return pd.DataFrame(columns=SCENARIO_COLS + ['Rank'])
+    return pd.concat(frames, ignore_index=True)
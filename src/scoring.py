@@ -0,0 +1,250 @@
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from optimization import (PERIODS, PREP_PARAMS, SCHEDULES, best_schedule, model_params, operating_labels,
+                          traffic_margins)
+from rent_zones import zone_index
+from spacing import project
+from traffic import traffic_cube
+
+# Largest request body accepted by the service
+MAX_BODY = 16 * 1024 * 1024  # bytes
+
+# Points further than this from every counting site get no traffic
+MAX_TRAFFIC_DISTANCE = 3000  # metres
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large'}
+
+
+class SiteScorer:
+    '''
+    scores arbitrary lat/lon points with the optimization's per-location
+    profit formula
+
+    rent comes from the rent zone containing the point (or, with
+    rent_fallback, from the zones around points outside every zone),
+    traffic from the k nearest counting sites of the survey day
+    (inverse-distance weighted when k > 1) within max_distance metres.
+    every site counted on the day is used for traffic, with or without a
+    rent of its own. the zone index and the KD-tree over the counting sites
+    are built once, so a query is a few vectorized lookups
+    '''
+
+    def __init__(self, df, neighborhoods, day='May07', k=1, rent_fallback=None,
+                 max_distance=MAX_TRAFFIC_DISTANCE, **params):
+        from scipy.spatial import cKDTree
+
+        self.day = day
+        self.k = k
+        self.rent_fallback = rent_fallback
+        self.max_distance = max_distance
+        self.params = model_params(**params)
+        cube = traffic_cube(df)
+        traffic = cube.survey(day)
+        lat, lon = cube.static['latitude'], cube.static['longitude']
+        counted = ~np.isnan(traffic).any(axis=1) & ~np.isnan(lat) & ~np.isnan(lon)
+        self.locations = cube.locations.to_numpy()[counted]
+        # one NaN row past the sites, what the tree returns for no neighbour
+        self.traffic = np.vstack([traffic[counted], np.full((1, len(PERIODS)), np.nan)])
+        self.ref_lat = float(lat[counted].mean())
+        self.tree = cKDTree(project(lat[counted], lon[counted], self.ref_lat))
+        self.zones = zone_index(neighborhoods)
+        self.zone_names = np.array(self.zones.names + [None], dtype=object)
+
+    def interpolate_traffic(self, lat, lon, k=None):
+        '''
+        (points, 3) traffic, the nearest site and its distance in metres.
+        traffic is NaN and the site -1 for points with no site within
+        max_distance
+        '''
+        n_sites = len(self.locations)
+        k = min(int(k or self.k), n_sites)
+        distance, nearest = self.tree.query(project(lat, lon, self.ref_lat), k=k,
+                                            distance_upper_bound=self.max_distance)
+        if k == 1:
+            traffic = self.traffic[nearest]
+        else:
+            found = nearest < n_sites
+            weights = np.where(found, 1.0 / np.maximum(distance, 1.0), 0.0)
+            with np.errstate(invalid='ignore'):
+                weights /= weights.sum(axis=1, keepdims=True)
+            traffic = np.where(found[:, :, None], self.traffic[nearest], 0.0)
+            traffic = (traffic * weights[:, :, None]).sum(axis=1)
+            nearest, distance = nearest[:, 0], distance[:, 0]
+        return traffic, np.where(nearest < n_sites, nearest, -1), distance
+
+    def score(self, lat, lon, shop_size=None, k=None):
+        '''
+        scores arrays of points; returns a dict of arrays with the zone, rent,
+        nearest site, traffic, best schedule and daily profit of each point.
+        profit is NaN for points without a rent (outside every rent zone and
+        no rent_fallback) and for points with no counting site within
+        max_distance, which also get no nearest site
+        '''
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        params = self.params if shop_size is None else dict(self.params, shop_size=float(shop_size))
+
+        zone = self.zones.query(lat, lon)
+        rent = self.zones.rents(lat, lon, fallback=self.rent_fallback)
+        traffic, nearest, distance = self.interpolate_traffic(lat, lon, k)
+
+        best, profit = best_schedule(*traffic_margins(traffic, rent / PREP_PARAMS['days_per_month'], params))
+        return {
+            'lat': lat, 'lon': lon,
+            'zone': self.zone_names[zone],
+            'rent_per_sqft': rent,
+            'nearest_location': np.where(nearest >= 0, self.locations[nearest], None),
+            'distance_m': np.where(nearest >= 0, distance, np.nan),
+            'traffic': traffic,
+            'operating_times': operating_labels(SCHEDULES[best]),
+            'daily_profit': profit,
+            'viable': profit >= params['min_daily_profit'],
+        }
+
+    def records(self, scored):
+        '''
+        the score() arrays as JSON-ready dicts, NaN as None. points with no
+        counting site within max_distance carry an error instead of traffic
+        '''
+        def clean(values, digits):
+            return [None if v != v else v for v in np.round(values, digits).tolist()]
+
+        traffic = scored['traffic'].round(1).tolist()
+        columns = zip(clean(scored['lat'], 6), clean(scored['lon'], 6), scored['zone'].tolist(),
+                      clean(scored['rent_per_sqft'], 2), scored['nearest_location'].tolist(),
+                      clean(scored['distance_m'], 1), traffic, scored['operating_times'].tolist(),
+                      clean(scored['daily_profit'], 2), scored['viable'].tolist())
+        return [{
+            'lat': lat, 'lon': lon, 'zone': zone, 'rent_per_sqft': rent,
+            'nearest_location': loc, 'distance_m': dist,
+            'traffic': dict(zip(PERIODS, t)) if loc is not None else None,
+            'operating_times': best if profit is not None else None,
+            'daily_profit': profit,
+            'viable': viable,
+            **({} if loc is not None else {'error': f"no counting site within {self.max_distance:g} m"}),
+        } for lat, lon, zone, rent, loc, dist, t, best, profit, viable in columns]
+
+
+def load_scorer(offline=False, day='May07', k=1, rent_fallback=None, counts=None,
+                max_distance=MAX_TRAFFIC_DISTANCE, **params):
+    '''
+    builds a SiteScorer from the preprocessed data and the rent zones.
+    counts streams the counting sites from that csv (see ingest) instead
+    of the gist data
+    '''
+    from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL, fetch_neighborhoods, parse_neighborhoods
+    from optimization import prepare_data
+
+    if counts:
+        from ingest import prepare_streamed
+        df = prepare_streamed(counts, NEIGHBORHOODS_URL, offline=offline, rent_fallback=rent_fallback)
+    else:
+        df = prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=offline, rent_fallback=rent_fallback)
+    neighborhoods = parse_neighborhoods(fetch_neighborhoods(NEIGHBORHOODS_URL, offline))
+    return SiteScorer(df, neighborhoods, day, k, rent_fallback, max_distance, **params)
+
+
+class ScoringService:
+    '''
+    minimal HTTP/1.1 JSON service over a SiteScorer, on asyncio streams
+
+    GET  /health
+    GET  /score?lat=..&lon=..[&shop_size=..]
+    POST /score        {"lat": .., "lon": .., "shop_size": ..}
+    POST /score/batch  {"points": [{"lat": .., "lon": ..}, ...], "shop_size": ..}
+                       or {"lat": [...], "lon": [...]}
+    '''
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+
+    def route(self, method, target, body):
+        '''
+        returns (status, payload) for one request
+        '''
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {'status': 'ok', 'day': self.scorer.day, 'sites': len(self.scorer.locations),
+                         'zones': len(self.scorer.zones.names)}
+        if url.path not in ('/score', '/score/batch'):
+            return 404, {'error': f"unknown path {url.path}"}
+
+        if method == 'GET' and url.path == '/score':
+            request = {key: values[0] for key, values in parse_qs(url.query).items()}
+        elif method == 'POST':
+            request = json.loads(body or b'{}')
+        else:
+            return 405, {'error': f"{method} not allowed on {url.path}"}
+
+        if 'points' in request:
+            lat = [p['lat'] for p in request['points']]
+            lon = [p['lon'] for p in request['points']]
+        else:
+            lat, lon = request['lat'], request['lon']
+        scored = self.scorer.score(lat, lon, request.get('shop_size'), request.get('k'))
+        results = self.scorer.records(scored)
+        if url.path == '/score/batch':
+            return 200, {'day': self.scorer.day, 'results': results}
+        if 'error' in results[0]:
+            return 400, results[0]
+        return 200, results[0]
+
+    async def handle(self, reader, writer):
+        '''
+        serves requests on one connection until the client closes it or asks
+        for Connection: close
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    status, payload = 413, {'error': f"body larger than {MAX_BODY} bytes"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, payload = self.route(method, target, body)
+                    except (KeyError, TypeError, ValueError, IndexError) as e:
+                        status, payload = 400, {'error': f"{type(e).__name__}: {e}"}
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Scoring {len(self.scorer.locations)} counting sites ({self.scorer.day}) "
+              f"on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def serve(scorer, host='127.0.0.1', port=8080):
+    asyncio.run(ScoringService(scorer).serve(host, port))
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from optimization import (PERIODS, PREP_PARAMS, SCHEDULES, model_params, select_candidates)
+
+
+def _schedule_terms(candidate_locs, day, params):
+    '''
+    splits the profit of every location and schedule into its linear parts:
+    profit = conversion * profit_per_customer * traffic - fixed - rent * shop_size
+
+    returns traffic (locations, schedules), fixed (schedules,) and the
+    daily rent per sqft (locations,)
+    '''
+    traffic = candidate_locs[[f'{day}_{t}' for t in PERIODS]].to_numpy(dtype=float)
+    per_period = params['electricity_cost'] * params['shop_size'] + params['staff_cost_per_shift']
+    schedule_traffic = traffic @ SCHEDULES.T
+    fixed = SCHEDULES.sum(axis=1) * per_period
+    rent_daily = candidate_locs['rent_per_sqft_daily'].to_numpy(dtype=float)
+    return schedule_traffic, fixed, rent_daily
+
+
+def break_even_conversion(candidate_locs, day='May07', target=None, params=None):
+    '''
+    minimum conversion rate (the same in every period) for each location
+    and schedule to clear the target daily profit, as a (locations,
+    schedules) array. inf where the schedule has no traffic
+    '''
+    params = params or model_params()
+    target = params['min_daily_profit'] if target is None else target
+    traffic, fixed, rent_daily = _schedule_terms(candidate_locs, day, params)
+    cost = target + fixed + (rent_daily * params['shop_size'])[:, None]
+    with np.errstate(divide='ignore'):
+        return np.where(traffic > 0, cost / (params['profit_per_customer'] * traffic), np.inf)
+
+
+def max_affordable_rent(candidate_locs, day='May07', target=None, params=None):
+    '''
+    highest monthly rent per sqft at which each location and schedule still
+    clears the target daily profit, as a (locations, schedules) array
+    '''
+    params = params or model_params()
+    target = params['min_daily_profit'] if target is None else target
+    # conversion differs by period, so revenue is built from the raw
+    # per-period traffic rather than the schedule totals
+    _, fixed, _ = _schedule_terms(candidate_locs, day, params)
+    conversion = np.array([params['conversion_rates'][t] for t in PERIODS])
+    raw = candidate_locs[[f'{day}_{t}' for t in PERIODS]].to_numpy(dtype=float)
+    revenue = (raw * conversion) @ SCHEDULES.T * params['profit_per_customer']
+    rent_daily = (revenue - fixed - target) / params['shop_size']
+    return rent_daily * PREP_PARAMS['days_per_month']
+
+
+def profit_surface(candidate_locs, conversion_grid, rent_grid, day='May07', params=None):
+    '''
+    best daily profit of every location over a conversion x rent grid, as a
+    (locations, conversions, rents) array. rent_grid is monthly $/sqft and
+    replaces each location's own rent
+
+    rent does not depend on the schedule, so the best schedule is found on
+    the (locations, conversions) plane before the rent axis is added
+    '''
+    params = params or model_params()
+    traffic, fixed, _ = _schedule_terms(candidate_locs, day, params)
+    conversion_grid = np.asarray(conversion_grid, dtype=float)
+    rent_grid = np.asarray(rent_grid, dtype=float)
+
+    revenue = traffic[:, None, :] * conversion_grid[None, :, None] * params['profit_per_customer']
+    best = (revenue - fixed).max(axis=2)
+    rent_cost = rent_grid / PREP_PARAMS['days_per_month'] * params['shop_size']
+    return best[:, :, None] - rent_cost[None, None, :]
+
+
+def sensitivity_table(df, day='May07', target=None, **params):
+    '''
+    per-location break-even conversion and maximum affordable rent, taking
+    the most favourable schedule for each
+    '''
+    params = model_params(**params)
+    candidate_locs = select_candidates(df, day)
+    conversion = break_even_conversion(candidate_locs, day, target, params)
+    rent = max_affordable_rent(candidate_locs, day, target, params)
+    return pd.DataFrame({
+        'Location': candidate_locs.index,
+        'Rent ($/sqft monthly)': candidate_locs['rent_per_sqft_daily'].to_numpy() * PREP_PARAMS['days_per_month'],
+        'Break-even Conversion': conversion.min(axis=1),
+        'Max Rent ($/sqft monthly)': rent.max(axis=1),
+    }).sort_values('Break-even Conversion').round(4)
+
+
+def save_surface(path, surface, locations, conversion_grid, rent_grid):
+    '''
+    writes a profit surface and its axes to a compressed .npz file
+    '''
+    np.savez_compressed(path, profit=surface, locations=np.asarray(locations),
+                        conversion=np.asarray(conversion_grid), rent=np.asarray(rent_grid))
+
+
+def plot_heatmap(surface, conversion_grid, rent_grid, output_file, title=None, target=500):
+    '''
+    saves one location's (conversions, rents) profit plane as a heatmap with
+    the target profit contour drawn in. needs matplotlib
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(7, 5))
+    mesh = ax.pcolormesh(rent_grid, conversion_grid, surface, shading='auto', cmap='RdYlGn')
+    ax.contour(rent_grid, conversion_grid, surface, levels=[target], colors='black', linewidths=1)
+    fig.colorbar(mesh, ax=ax, label='Daily Profit ($)')
+    ax.set_xlabel('Rent ($/sqft monthly)')
+    ax.set_ylabel('Conversion Rate')
+    if title:
+        ax.set_title(title)
+    fig.savefig(output_file, dpi=150, bbox_inches='tight')
+    plt.close(fig)
@@ -0,0 +1,72 @@
+import numpy as np
+
+# metres per degree of latitude; longitude is scaled by cos(latitude)
+METERS_PER_DEGREE = 111_320
+
+
+def project(lat, lon, ref_lat=None):
+    '''
+    equirectangular projection of lat/lon to metres around ref_lat (the
+    data's mean latitude by default), accurate to well under 1% across the
+    city
+    '''
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if ref_lat is None:
+        ref_lat = lat.mean() if len(lat) else 0.0
+    scale = np.cos(np.radians(ref_lat))
+    return np.column_stack([lon * scale * METERS_PER_DEGREE, lat * METERS_PER_DEGREE])
+
+
+def conflict_pairs(lat, lon, min_distance):
+    '''
+    every pair of points closer than min_distance metres, as an (pairs, 2)
+    array of row positions with i < j. uses a KD-tree instead of checking
+    all pairs
+    '''
+    from scipy.spatial import cKDTree
+
+    tree = cKDTree(project(lat, lon))
+    return tree.query_pairs(min_distance, output_type='ndarray')
+
+
+def conflict_cliques(n_points, pairs):
+    '''
+    covers the conflict graph with cliques: every conflicting pair ends up in
+    at least one clique, and each clique becomes a single "open at most one"
+    constraint instead of one constraint per pair
+
+    greedy: each uncovered pair is grown into a clique by repeatedly adding
+    a point that conflicts with every member so far
+    '''
+    neighbors = [set() for _ in range(n_points)]
+    for i, j in pairs:
+        neighbors[i].add(j)
+        neighbors[j].add(i)
+
+    covered = set()
+    cliques = []
+    for i, j in pairs:
+        i, j = int(i), int(j)
+        if (i, j) in covered:
+            continue
+        clique = [i, j]
+        candidates = neighbors[i] & neighbors[j]
+        while candidates:
+            v = min(candidates)
+            clique.append(v)
+            candidates &= neighbors[v]
+        clique.sort()
+        for a_pos, a in enumerate(clique):
+            for b in clique[a_pos + 1:]:
+                covered.add((a, b))
+        cliques.append(clique)
+    return cliques
+
+
+def spacing_cliques(candidate_locs, min_distance):
+    '''
+    cliques of candidate locations that are closer than min_distance metres
+    '''
+    pairs = conflict_pairs(candidate_locs['latitude'], candidate_locs['longitude'], min_distance)
+    return conflict_cliques(len(candidate_locs), pairs)
@@ -0,0 +1,228 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from optimization import (PERIODS, SHIFT_HOURS, STAFF_PER_SHIFT, STAFF_WAGE, model_params,
+                          select_candidates)
+from traffic import PERIOD_WINDOWS, WINDOW_HOURS
+
+# Operating day, one slot per hour from 6:00 to 24:00
+HOURS = np.arange(6, 24)
+
+# Survey period each hour's traffic is scaled from: the nearest count window,
+# the earlier one on a tie (6-10 AM, 11-15 MD, 16-23 PM)
+_midpoints = [(PERIOD_WINDOWS[a][1] + PERIOD_WINDOWS[b][0]) / 2 for a, b in zip(PERIODS, PERIODS[1:])]
+HOUR_PERIOD = np.searchsorted(_midpoints, HOURS, side='left')
+
+# Each hour's traffic relative to the hourly rate of its period's count window
+HOURLY_SHAPE = np.array([0.5, 1.0, 1.0, 0.8, 0.6,                   # 6-10
+                         0.8, 1.0, 1.0, 0.8, 0.7,                   # 11-15
+                         1.0, 1.0, 1.0, 0.7, 0.5, 0.35, 0.25, 0.15])  # 16-23
+
+THROUGHPUT_PER_STAFF = 30  # customers served per staff member per hour
+MAX_STAFF = 6
+
+
+def hourly_traffic(candidate_locs, day='May07'):
+    '''
+    (locations, hours) pedestrians per hour, spreading each survey count
+    over its window and shaping the hours around it with HOURLY_SHAPE
+    '''
+    traffic = candidate_locs[[f'{day}_{t}' for t in PERIODS]].to_numpy(dtype=float)
+    return (traffic / WINDOW_HOURS)[:, HOUR_PERIOD] * HOURLY_SHAPE
+
+
+def slot_profits(traffic, levels, params, staff_wage, throughput):
+    '''
+    (locations, hours, levels) profit of one open hour at each staff level:
+    customers capped by the staff's throughput, minus wages and the hourly
+    share of utilities
+    '''
+    conversion = np.array([params['conversion_rates'][t] for t in PERIODS])[HOUR_PERIOD]
+    demand = traffic * conversion
+    customers = np.minimum(demand[:, :, None], levels * throughput)
+    utilities = params['electricity_cost'] * params['shop_size'] / SHIFT_HOURS
+    return customers * params['profit_per_customer'] - levels * staff_wage - utilities
+
+
+def _schedule_dp(profit, rent_cost, min_shift):
+    '''
+    best staffing of every location at once
+
+    profit is (locations, hours, levels). a location opens at most once, in
+    one contiguous block, and holds each staff level for at least min_shift
+    hours before changing it or closing, so (adding and releasing staff last
+    in, first out) every shift is a contiguous run of at least min_shift
+    hours. the state is (level, hours at that level, capped at min_shift)
+    plus not-yet-open and closed; rent is charged on opening
+
+    returns the best profit and the (locations, hours) level index, -1 when
+    closed
+    '''
+    n, n_hours, n_levels = profit.shape
+    runs = min_shift
+    rows = np.arange(n)
+    pre = np.zeros(n)
+    post = np.full(n, -np.inf)
+    held = np.full((n, n_levels, runs), -np.inf)
+    levels = np.arange(n_levels)
+
+    # back pointers: where each level's first hour came from (-1 = opening),
+    # whether the capped run stayed capped, and which level a close came from
+    start_from = np.empty((n_hours, n, n_levels), dtype=np.int16)
+    stayed = np.empty((n_hours, n, n_levels), dtype=bool)
+    closed_from = np.empty((n_hours, n), dtype=np.int16)
+
+    for h in range(n_hours):
+        done = held[:, :, -1]
+        if runs == 1:
+            # every run is complete, so a level may follow any level, itself included
+            switch_from = np.broadcast_to(done.argmax(axis=1)[:, None], (n, n_levels))
+        else:
+            # best completed level other than the one switched to
+            top = np.argsort(-done, axis=1)[:, :2]
+            switch_from = np.where(levels == top[:, :1], top[:, -1:], top[:, :1])
+        switch_value = np.take_along_axis(done, switch_from, axis=1)
+        if runs > 1:
+            switch_value = np.where(switch_from == levels, -np.inf, switch_value)
+        open_value = (pre - rent_cost)[:, None]
+        from_open = open_value >= switch_value
+
+        new_held = np.empty_like(held)
+        new_held[:, :, 0] = np.where(from_open, open_value, switch_value)
+        start_from[h] = np.where(from_open, -1, switch_from)
+        if runs > 1:
+            new_held[:, :, 1:-1] = held[:, :, :-2]
+            stay = held[:, :, -1] >= held[:, :, -2]
+            stayed[h] = stay
+            new_held[:, :, -1] = np.where(stay, held[:, :, -1], held[:, :, -2])
+        new_held += profit[:, h, :, None]
+
+        close_level = done.argmax(axis=1)
+        close_value = done[rows, close_level]
+        from_post = post >= close_value
+        closed_from[h] = np.where(from_post, -1, close_level)
+        post = np.where(from_post, post, close_value)
+        held = new_held
+
+    # end of day: never opened, closed earlier, or closing a completed level
+    done = held[:, :, -1]
+    end_level = done.argmax(axis=1)
+    end_value = np.stack([pre, post, done[rows, end_level]], axis=1)
+    state = end_value.argmax(axis=1)
+    value = end_value[rows, state]
+
+    # walk back through the hours
+    schedule = np.full((n, n_hours), -1, dtype=np.int16)
+    level = np.where(state == 2, end_level, 0)
+    run = np.full(n, runs - 1)
+    phase = state  # 0 not yet open, 1 closed, 2 open
+    for h in range(n_hours - 1, -1, -1):
+        is_open = phase == 2
+        schedule[is_open, h] = level[is_open]
+
+        # open at hour h: step back to the previous state
+        first = is_open & (run == 0)
+        source = start_from[h, rows, level]
+        run_prev = np.where(first, runs - 1, run - 1)
+        if runs > 1:
+            capped = is_open & (run == runs - 1)
+            run_prev = np.where(capped & stayed[h, rows, level], runs - 1, run_prev)
+            run_prev = np.where(first, runs - 1, run_prev)
+        opened = first & (source < 0)
+        level = np.where(first & ~opened, source, level)
+        run = np.where(is_open, run_prev, run)
+        phase = np.where(opened, 0, phase)
+
+        # closed at hour h: either already closed or closed this hour
+        was_closed = phase == 1
+        came_from = closed_from[h]
+        reopen = was_closed & (came_from >= 0)
+        level = np.where(reopen, came_from, level)
+        run = np.where(reopen, runs - 1, run)
+        phase = np.where(reopen, 2, phase)
+    return value, schedule
+
+
+def optimize_staffing(df, day='May07', max_staff=MAX_STAFF, min_staff=STAFF_PER_SHIFT,
+                      min_shift=SHIFT_HOURS, throughput=THROUGHPUT_PER_STAFF, staff_wage=STAFF_WAGE,
+                      chunk_size=20_000, processes=None, **params):
+    '''
+    hourly opening and staffing plan for every candidate location
+
+    each open hour has between min_staff and max_staff staff, each serving
+    up to `throughput` customers an hour. locations are independent, so
+    each one is solved by a dynamic program over the day (see _schedule_dp),
+    vectorized across locations in chunks of chunk_size and optionally split
+    over `processes` workers
+
+    returns the results table (locations clearing the profit floor) and the
+    staff per hour of those locations
+    '''
+    params = model_params(staff_wage=staff_wage, **params)
+    candidate_locs = select_candidates(df, day)
+    traffic = hourly_traffic(candidate_locs, day)
+    levels = np.arange(min_staff, max_staff + 1)
+    rent_cost = candidate_locs['rent_per_sqft_daily'].to_numpy(dtype=float) * params['shop_size']
+
+    bounds = range(0, len(candidate_locs), chunk_size)
+    chunks = [(slot_profits(traffic[i:i + chunk_size], levels, params, staff_wage, throughput),
+               rent_cost[i:i + chunk_size], min_shift) for i in bounds]
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = list(pool.map(_schedule_dp, *zip(*chunks)))
+    else:
+        parts = [_schedule_dp(*chunk) for chunk in chunks]
+    level_index = np.concatenate([p[1] for p in parts]) if parts else np.empty((0, len(HOURS)), dtype=np.int16)
+
+    staff = np.where(level_index >= 0, levels[np.maximum(level_index, 0)], 0)
+    is_open = staff > 0
+    conversion = np.array([params['conversion_rates'][t] for t in PERIODS])[HOUR_PERIOD]
+    customers = (np.minimum(traffic * conversion, staff * throughput) * is_open).sum(axis=1)
+    open_hours = is_open.sum(axis=1)
+    staff_cost = staff.sum(axis=1) * staff_wage
+    utility_cost = open_hours * params['electricity_cost'] * params['shop_size'] / SHIFT_HOURS
+    revenue = customers * params['profit_per_customer']
+    profit = np.where(open_hours > 0, revenue - staff_cost - utility_cost - rent_cost, 0.0)
+    keep = (open_hours > 0) & (profit >= params['min_daily_profit'])
+
+    first = is_open.argmax(axis=1)
+    last = len(HOURS) - 1 - is_open[:, ::-1].argmax(axis=1)
+    results = pd.DataFrame({
+        'Location': candidate_locs.index[keep],
+        'Opening Hours': [f"{HOURS[a]}:00-{HOURS[b] + 1}:00" for a, b in zip(first[keep], last[keep])],
+        'Staff Hours': staff.sum(axis=1)[keep],
+        'Peak Staff': staff.max(axis=1)[keep],
+        'Daily Customers': customers[keep].astype(int),
+        'Daily Revenue': revenue[keep],
+        'Daily Staff': staff_cost[keep],
+        'Daily Utilities': utility_cost[keep],
+        'Daily Rent': rent_cost[keep],
+        'Daily Profit': profit[keep],
+    })
+    schedule = pd.DataFrame(staff[keep], index=candidate_locs.index[keep], columns=[f"{h}:00" for h in HOURS])
+    order = results['Daily Profit'].to_numpy().argsort()[::-1]
+    return results.iloc[order].round(2), schedule.iloc[order]
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL
+    from optimization import prepare_data
+
+    parser = argparse.ArgumentParser(description="Hourly opening and staffing plan per location")
+    parser.add_argument('--day', default='May07', help="survey day, e.g. May07")
+    parser.add_argument('--max-staff', type=int, default=MAX_STAFF)
+    parser.add_argument('--throughput', type=float, default=THROUGHPUT_PER_STAFF,
+                        help="customers per staff member per hour")
+    parser.add_argument('--offline', action='store_true',
+                        help="read the local data files instead of downloading the gists")
+    args = parser.parse_args()
+
+    df_processed = prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline)
+    results, schedule = optimize_staffing(df_processed, args.day, max_staff=args.max_staff,
+                                          throughput=args.throughput)
+    print(results.to_string(index=False))
+    print("\nStaff per hour:\n")
+    print(schedule.to_string())
@@ -1,15 +1,12 @@
 import pandas as pd
 from shapely.geometry import Point
-import requests
 from io import StringIO
-import json
+from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL, fetch_sources, parse_neighborhoods
 
-# Load the data from the Gist
-pedestrianCounts = requests.get("https://gist.githubusercontent.com/JoshBong/d83569f9837962d98b2c16d2312ed2d2/raw").text
-p = "https://gist.githubusercontent.com/JoshBong/5e6697ffa29f3db776254188a5aea8fb/raw/6621a3cf7fcde270097be79a1b5fe5c5716ae618/gistfile1.txt"
-neighborhoods_text = requests.get(p).text
+# Load the data from the Gist (cached on disk after the first run)
+pedestrianCounts, neighborhoods_text = fetch_sources(PEDESTRIAN_URL, NEIGHBORHOODS_URL)
 # print(neighborhoods_text)
-neighborhoods = json.loads(neighborhoods_text)
+neighborhoods = parse_neighborhoods(neighborhoods_text)
 df = pd.read_csv(StringIO(pedestrianCounts))
 # print(df['Loc'])
 # print(neighborhoods.keys())
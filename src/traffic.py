@@ -0,0 +1,199 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+PERIODS = ['AM', 'MD', 'PM']
+
+# Hours each period's count covers, [start, end): AM 7-9, MD 12-14, PM 16-19
+PERIOD_WINDOWS = {'AM': (7, 9), 'MD': (12, 14), 'PM': (16, 19)}
+WINDOW_HOURS = np.array([PERIOD_WINDOWS[t][1] - PERIOD_WINDOWS[t][0] for t in PERIODS])
+
+# Count columns look like May07_AM, Sept15_MD or (inconsistently) May22_pM
+COUNT_COLUMN = re.compile(r'^([A-Za-z]+)(\d{2})_(AM|MD|PM)$', re.IGNORECASE)
+
+MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6, 'july': 7,
+          'jul': 7, 'aug': 8, 'sept': 9, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+# Per-location attributes carried alongside the counts when present
+STATIC_COLS = ['rent_per_sqft', 'rent_per_sqft_daily', 'latitude', 'longitude']
+
+# Key of a frame's TrafficCube in its attrs
+CUBE_ATTR = 'traffic_cube'
+
+
+def count_columns(columns):
+    '''
+    maps each pedestrian count column to its canonical (survey, period)
+    name, e.g. May22_pM -> ('May22', 'PM')
+    '''
+    found = {}
+    for col in columns:
+        match = COUNT_COLUMN.match(col)
+        if match and match.group(1).lower() in MONTHS:
+            found[col] = (match.group(1) + match.group(2), match.group(3).upper())
+    return found
+
+
+def window_period(hours):
+    '''
+    index into PERIODS of the count window each hour (0-23) falls in, -1
+    outside every window
+    '''
+    hours = np.asarray(hours)
+    period = np.full(hours.shape, -1)
+    for p, t in enumerate(PERIODS):
+        start, end = PERIOD_WINDOWS[t]
+        period[(hours >= start) & (hours < end)] = p
+    return period
+
+
+def canonicalize_columns(df):
+    '''
+    renames the count columns to the Survey_PERIOD spelling
+    '''
+    renames = {col: f'{survey}_{period}' for col, (survey, period) in count_columns(df.columns).items()
+               if col != f'{survey}_{period}'}
+    return df.rename(columns=renames) if renames else df
+
+
+def survey_date(survey):
+    '''
+    first of the survey month, e.g. Sept15 -> 2015-09-01
+    '''
+    match = re.match(r'^([A-Za-z]+)(\d{2})$', survey)
+    return np.datetime64(f'20{match.group(2)}-{MONTHS[match.group(1).lower()]:02d}-01')
+
+
+class TrafficCube:
+    '''
+    pedestrian counts as one (locations, surveys, periods) array
+
+    surveys are sorted by date. counts are NaN where a count is missing and
+    mask is True where it was observed. per-location attributes (rent,
+    coordinates) are kept as (locations,) arrays in static
+    '''
+
+    def __init__(self, locations, surveys, counts, static=None):
+        self.locations = pd.Index(locations, name='Loc')
+        self.surveys = list(surveys)
+        self.dates = np.array([survey_date(s) for s in self.surveys])
+        self.counts = counts
+        self.mask = ~np.isnan(counts)
+        self.static = static or {}
+        self._survey_pos = {s: i for i, s in enumerate(self.surveys)}
+        # the source columns and their backing arrays, see attach_cube
+        self._source = None
+        self._source_key = None
+
+    def __deepcopy__(self, memo):
+        # pandas deep-copies attrs into every frame derived from one; a cube
+        # is never modified, so the copies share it
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_source'] = state['_source_key'] = None
+        return state
+
+    @classmethod
+    def from_frame(cls, df):
+        '''
+        builds the cube from a wide frame with one count column per survey and
+        period; rows sharing a Loc are averaged
+        '''
+        columns = count_columns(df.columns)
+        surveys = sorted({survey for survey, _ in columns.values()}, key=survey_date)
+        survey_pos = {s: i for i, s in enumerate(surveys)}
+
+        static_cols = [c for c in STATIC_COLS if c in df.columns]
+        grouped = df.groupby('Loc')[list(columns) + static_cols].mean()
+
+        counts = np.full((len(grouped), len(surveys), len(PERIODS)), np.nan)
+        for col, (survey, period) in columns.items():
+            counts[:, survey_pos[survey], PERIODS.index(period)] = grouped[col].to_numpy(dtype=float)
+
+        static = {c: grouped[c].to_numpy(dtype=float) for c in static_cols}
+        return cls(grouped.index, surveys, counts, static)
+
+    def survey(self, survey):
+        '''
+        (locations, periods) counts of one survey
+        '''
+        return self.counts[:, self._survey_pos[survey], :]
+
+    def totals(self):
+        '''
+        (locations, surveys) daily totals, NaN where any period is missing
+        '''
+        return self.counts.sum(axis=2)
+
+    def complete(self):
+        '''
+        locations with every period of every survey observed
+        '''
+        return self.mask.all(axis=(1, 2))
+
+    def daily_avg(self):
+        '''
+        average daily total per location over the surveys it has complete
+        counts for
+        '''
+        totals = self.totals()
+        observed = ~np.isnan(totals)
+        with np.errstate(invalid='ignore'):
+            return np.where(observed, totals, 0).sum(axis=1) / observed.sum(axis=1)
+
+
+def cube_columns(df):
+    '''
+    the columns a TrafficCube is built from: Loc, the counts and the static
+    attributes
+    '''
+    return ['Loc'] + list(count_columns(df.columns)) + [c for c in STATIC_COLS if c in df.columns]
+
+
+def _backing(series):
+    # the array holding a column's values: its address for numpy data,
+    # the extension array object otherwise
+    if isinstance(series.dtype, np.dtype):
+        values = series.to_numpy(copy=False)
+        return values.__array_interface__['data'][0], values.strides, len(values)
+    return id(series.array), len(series)
+
+
+def _source_key(df, columns):
+    return tuple((c, _backing(df[c])) for c in columns)
+
+
+def attach_cube(df, cube=None):
+    '''
+    stores the TrafficCube of a frame (built from it unless given) in the
+    frame's attrs, where traffic_cube finds it. prepare_data and
+    prepare_streamed attach the cube of the frame they return, so later
+    lookups slice it instead of regrouping the counts
+
+    the cube keeps a shallow copy of its source columns. with copy-on-write,
+    any later write to those columns of the frame (loc, iloc, replacing a
+    column) gives them new backing arrays instead of changing the shared
+    ones, which is how traffic_cube notices the edit
+    '''
+    columns = cube_columns(df)
+    cube = cube or TrafficCube.from_frame(df)
+    cube._source = df[columns]
+    cube._source_key = _source_key(df, columns)
+    df.attrs[CUBE_ATTR] = cube
+    return cube
+
+
+def traffic_cube(df):
+    '''
+    the TrafficCube attached to a frame, rebuilt and reattached when the
+    frame has none or its Loc, count or static columns no longer have the
+    arrays the cube was built from: edited in place, replaced, filtered,
+    or unpickled. a shallow copy sharing the same arrays shares the cube
+    '''
+    cube = df.attrs.get(CUBE_ATTR)
+    if cube is None or cube._source_key != _source_key(df, cube_columns(df)):
+        cube = attach_cube(df)
+    return cube
@@ -0,0 +1,137 @@
+import time
+
+import numpy as np
+from gurobipy import GRB
+
+from optimization import (PERIODS, PREP_PARAMS, build_gurobi_model, model_params,
+                          period_margins, select_candidates, summarize_results)
+from rent_zones import zone_index
+
+
+class WhatIfOptimizer:
+    '''
+    long-lived Gurobi model for one survey day
+
+    the setters only touch the objective coefficients and constraint
+    coefficients that depend on the edited input, and every solve starts
+    from the previous solution. solving again without an edit returns the
+    previous results without calling Gurobi
+    '''
+
+    def __init__(self, df, day='May07', neighborhoods=None, **params):
+        self.day = day
+        self._overrides = dict(params)
+        self.params = model_params(**params)
+        self.candidate_locs = select_candidates(df, day)
+        self.locations = self.candidate_locs.index
+
+        # zone of every location, for set_zone_rent
+        self.zones = None
+        if neighborhoods is not None:
+            coords = df.groupby('Loc')[['latitude', 'longitude']].first().loc[self.locations]
+            index = zone_index(neighborhoods)
+            zone = index.query(coords['latitude'], coords['longitude'])
+            self.zones = np.array([index.names[z] if z >= 0 else None for z in zone], dtype=object)
+
+        start = time.perf_counter()
+        self.model, self.x, self.y = build_gurobi_model(self.candidate_locs, day, self.params)
+        self.model.Params.OutputFlag = 0
+        self.model.update()
+        self.build_time = time.perf_counter() - start
+
+        self.margins, self.rent_cost = period_margins(self.candidate_locs, day, self.params)
+        self._x_list = self.x.tolist()
+        self._y_list = self.y.tolist()
+        self._min_profit = self.model._min_profit.tolist()
+        self.solve_time = None
+        self._results = None
+
+    def _loc_positions(self, locations):
+        if locations is None:
+            return np.arange(len(self.locations))
+        return self.locations.get_indexer(list(locations))
+
+    def set_rent(self, rent_per_sqft, locations=None):
+        '''
+        sets the monthly rent per sqft of the given locations (default all)
+        '''
+        pos = self._loc_positions(locations)
+        pos = pos[pos >= 0]
+        col = self.candidate_locs.columns.get_loc('rent_per_sqft_daily')
+        self.candidate_locs.iloc[pos, col] = rent_per_sqft / PREP_PARAMS['days_per_month']
+        self._refresh()
+
+    def set_zone_rent(self, zone, rent_per_sqft):
+        '''
+        sets the monthly rent per sqft of every location in a rent zone
+        '''
+        if self.zones is None:
+            raise ValueError("set_zone_rent needs the neighborhoods passed to WhatIfOptimizer")
+        self.set_rent(rent_per_sqft, self.locations[self.zones == zone])
+
+    def set_conversion_rate(self, rate, period=None):
+        '''
+        sets the conversion rate of one period, or of every period
+        '''
+        rates = dict(self.params['conversion_rates'])
+        for t in ([period] if period else PERIODS):
+            rates[t] = rate
+        self._update(conversion_rates=rates)
+
+    def set_staff_wage(self, wage):
+        '''
+        sets the hourly staff wage
+        '''
+        self._update(staff_wage=wage)
+
+    def _update(self, **params):
+        self._overrides.update(params)
+        self.params = model_params(**self._overrides)
+        self._refresh()
+
+    def _refresh(self):
+        '''
+        pushes changed margins and rents into the model, leaving every
+        unaffected coefficient alone
+        '''
+        margins, rent_cost = period_margins(self.candidate_locs, self.day, self.params)
+        floor = self.params['min_daily_profit']
+
+        changed_y = np.argwhere(margins != self.margins)
+        changed_x = np.flatnonzero(rent_cost != self.rent_cost)
+        if len(changed_y) == 0 and len(changed_x) == 0:
+            return
+
+        if len(changed_y):
+            self.y.Obj = margins
+            for i, t in changed_y:
+                self.model.chgCoeff(self._min_profit[i], self._y_list[i][t], margins[i, t])
+        if len(changed_x):
+            self.x.Obj = -rent_cost
+            for i in changed_x:
+                self.model.chgCoeff(self._min_profit[i], self._x_list[i], -rent_cost[i] - floor)
+
+        self.margins, self.rent_cost = margins, rent_cost
+        self._results = None
+
+    def solve(self):
+        '''
+        re-solves from the previous solution and returns the results table,
+        or None if no optimal solution exists
+        '''
+        if self._results is not None:
+            self.solve_time = 0.0
+            return self._results
+
+        start = time.perf_counter()
+        self.model.optimize()
+        self.solve_time = time.perf_counter() - start
+        if self.model.status != GRB.OPTIMAL:
+            return None
+
+        is_open, operating = self.x.X > 0.5, self.y.X > 0.5
+        # warm start the next solve from this one
+        self.x.Start = self.x.X
+        self.y.Start = self.y.X
+        self._results = summarize_results(self.candidate_locs, is_open, operating, self.day, self.params)
+        return self._results
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+from rent_zones import zone_index
+from spacing import METERS_PER_DEGREE
+
+
+def zone_bounds(neighborhoods):
+    '''
+    (zones, 4) lat_min, lat_max, lon_min, lon_max of every zone; zones with
+    a polygon use the polygon's bounding box
+    '''
+    bounds = []
+    for z in neighborhoods.values():
+        if 'polygon' in z:
+            lon, lat = np.asarray(z['polygon'], dtype=float).T
+            bounds.append([lat.min(), lat.max(), lon.min(), lon.max()])
+        else:
+            bounds.append([z['lat_min'], z['lat_max'], z['lon_min'], z['lon_max']])
+    return np.array(bounds, dtype=float).reshape(-1, 4)
+
+
+def overlapping_pairs(bounds):
+    '''
+    every pair (i, j), i < j, of boxes with a point in common, by sweeping
+    across longitude: boxes are visited by lon_min, boxes that ended before
+    the current one starts leave the active set, and only the active ones
+    are checked for overlapping latitude intervals. boxes that only touch
+    along an edge or at a corner count too, since zone lookups include the
+    edges and sites sit on shared edges once coordinates are rounded
+    '''
+    lat_min, lat_max, lon_min, lon_max = bounds.T
+    active = np.empty(0, dtype=np.int64)
+    pairs = []
+    for i in np.argsort(lon_min, kind='stable'):
+        active = active[lon_max[active] >= lon_min[i]]
+        hits = active[(lat_min[active] <= lat_max[i]) & (lat_max[active] >= lat_min[i])]
+        pairs.extend((min(i, j), max(i, j)) for j in hits.tolist())
+        active = np.append(active, i)
+    return np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+
+
+def overlapping_zones(neighborhoods):
+    '''
+    every pair of overlapping or touching rent zones. points in the overlap
+    or on the shared edge get the rent of the zone listed first, shown in
+    "Resolved To"; touching zones have zero overlap area
+
+    polygon zones are paired by bounding box, then kept only if the outlines
+    really meet
+    '''
+    names = list(neighborhoods)
+    zones = list(neighborhoods.values())
+    bounds = zone_bounds(neighborhoods)
+    pairs = overlapping_pairs(bounds)
+
+    if any('polygon' in z for z in zones) and len(pairs):
+        import shapely
+
+        geometries = zone_index(neighborhoods).geometries
+        first, second = geometries[pairs[:, 0]], geometries[pairs[:, 1]]
+        meet = shapely.intersects(first, second)
+        pairs = pairs[meet]
+        overlap_deg2 = shapely.area(shapely.intersection(first[meet], second[meet]))
+    else:
+        lo = np.maximum(bounds[pairs[:, 0]], bounds[pairs[:, 1]])
+        hi = np.minimum(bounds[pairs[:, 0]], bounds[pairs[:, 1]])
+        overlap_deg2 = (hi[:, 1] - lo[:, 0]) * (hi[:, 3] - lo[:, 2])
+
+    ref_lat = bounds[:, :2].mean() if len(bounds) else 0.0
+    km2_per_deg2 = (METERS_PER_DEGREE / 1000) ** 2 * np.cos(np.radians(ref_lat))
+    rent = np.array([z['rent'] for z in zones], dtype=float)
+    return pd.DataFrame({
+        'Zone': [names[i] for i in pairs[:, 0]],
+        'Other Zone': [names[j] for j in pairs[:, 1]],
+        'Overlap (km2)': (overlap_deg2 * km2_per_deg2).round(4),
+        'Rent': rent[pairs[:, 0]],
+        'Other Rent': rent[pairs[:, 1]],
+        'Resolved To': [names[i] for i in pairs[:, 0]],
+    })
+
+
+def ambiguous_sites(df, neighborhoods):
+    '''
+    sites inside more than one rent zone, with every zone containing them
+    and their rents in listed order, and the zone the lookup resolves to
+    (the first one)
+    '''
+    index = zone_index(neighborhoods)
+    sites = df.drop_duplicates('Loc')
+    point, zone = index.matches(sites['latitude'].to_numpy(dtype=float),
+                                sites['longitude'].to_numpy(dtype=float))
+    hits = np.bincount(point, minlength=len(sites))
+    keep = hits[point] > 1
+    point, zone = point[keep], zone[keep]
+    groups = np.split(zone, np.flatnonzero(np.diff(point)) + 1) if len(point) else []
+    rows = np.unique(point)
+    return pd.DataFrame({
+        'Loc': sites['Loc'].to_numpy()[rows],
+        'latitude': sites['latitude'].to_numpy()[rows],
+        'longitude': sites['longitude'].to_numpy()[rows],
+        'Zones': [', '.join(index.names[z] for z in g) for g in groups],
+        'Rents': [', '.join(f"{index.rent[z]:.2f}" for z in g) for g in groups],
+        'Resolved To': [index.names[g[0]] for g in groups],
+    })
+
+
+def uncovered_sites(df, neighborhoods):
+    '''
+    sites outside every rent zone, with the closest zone, its distance and
+    the rent the nearest and idw fallbacks would assign
+    '''
+    index = zone_index(neighborhoods)
+    sites = df.drop_duplicates('Loc')
+    lat = sites['latitude'].to_numpy(dtype=float)
+    lon = sites['longitude'].to_numpy(dtype=float)
+    outside = index.query(lat, lon) < 0
+    lat, lon = lat[outside], lon[outside]
+
+    distance = index.distances(lat, lon) if len(lat) else np.empty((0, len(index.names)))
+    closest = distance.argmin(axis=1) if len(index.names) else np.zeros(len(lat), dtype=np.int64)
+    return pd.DataFrame({
+        'Loc': sites['Loc'].to_numpy()[outside],
+        'latitude': lat,
+        'longitude': lon,
+        'Nearest Zone': [index.names[z] for z in closest],
+        'Distance (m)': distance[np.arange(len(lat)), closest].round(1),
+        'Nearest Rent': index.fallback_rents(lat, lon, 'nearest'),
+        'IDW Rent': index.fallback_rents(lat, lon, 'idw').round(2),
+    })
+
+
+def coverage_report(df, neighborhoods):
+    '''
+    prints overlapping zones, sites inside more than one zone and uncovered
+    sites; returns the three tables
+    '''
+    overlaps = overlapping_zones(neighborhoods)
+    ambiguous = ambiguous_sites(df, neighborhoods)
+    uncovered = uncovered_sites(df, neighborhoods)
+    n_sites = df['Loc'].nunique()
+
+    print(f"{len(neighborhoods)} rent zones, {n_sites} counting sites\n")
+    print(f"{len(overlaps)} overlapping or touching zone pairs (first listed zone wins):\n")
+    if len(overlaps):
+        print(overlaps.to_string(index=False))
+    print(f"\n{len(ambiguous)} of {n_sites} sites are inside more than one zone:\n")
+    if len(ambiguous):
+        print(ambiguous.to_string(index=False))
+    print(f"\n{len(uncovered)} of {n_sites} sites are outside every zone "
+          f"(dropped unless a rent fallback is used):\n")
+    if len(uncovered):
+        print(uncovered.to_string(index=False))
+    return overlaps, ambiguous, uncovered
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL, fetch_sources, parse_neighborhoods
+    from get_neighborhood import get_neighborhoods
+
+    parser = argparse.ArgumentParser(description="Check rent zones for overlaps and uncovered sites")
+    parser.add_argument('--offline', action='store_true',
+                        help="read the local data files instead of downloading the gists")
+    args = parser.parse_args()
+
+    df = get_neighborhoods(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=args.offline)
+    _, neighborhoods_text = fetch_sources(PEDESTRIAN_URL, NEIGHBORHOODS_URL, args.offline)
+    coverage_report(df, parse_neighborhoods(neighborhoods_text))
@@ -0,0 +1,44 @@
+import importlib.util
+
+import pandas as pd
+import pytest
+
+from data_sources import PEDESTRIAN_URL, NEIGHBORHOODS_URL
+from optimization import optimize_coffee_shops, prepare_data
+
+pytestmark = pytest.mark.skipif(importlib.util.find_spec('gurobipy') is None,
+                                reason="gurobipy is not installed")
+
+
+@pytest.fixture(scope='module')
+def df():
+    return prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=True, use_store=False)
+
+
+def _solve_both(df, **params):
+    import gurobipy as gp
+
+    try:
+        gurobi = optimize_coffee_shops(df, backend='gurobi', **params)
+    except gp.GurobiError as e:
+        pytest.skip(f"gurobi unavailable: {e}")
+    return gurobi, optimize_coffee_shops(df, backend='numpy', **params)
+
+
+@pytest.mark.parametrize('day, params', [
+    ('May07', {}),
+    ('Sept07', {}),
+    ('May07', {'shop_size': 600}),
+    ('May07', {'conversion_rates': {'AM': 0.05, 'MD': 0.1, 'PM': 0.12}}),
+])
+def test_backends_agree(df, day, params):
+    gurobi, numpy = _solve_both(df, day=day, **params)
+    assert len(numpy) > 0
+    pd.testing.assert_frame_equal(gurobi.reset_index(drop=True), numpy.reset_index(drop=True))
+
+
+def test_backends_agree_when_nothing_clears_the_floor(df):
+    gurobi, numpy = _solve_both(df, staff_wage=500)
+    assert gurobi is not None and numpy is not None
+    assert gurobi.empty and numpy.empty
+    pd.testing.assert_frame_equal(gurobi.reset_index(drop=True), numpy.reset_index(drop=True))
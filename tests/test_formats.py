@@ -0,0 +1,66 @@
+import itertools
+
+import numpy as np
+
+from formats import dp_selection, greedy_selection, lagrangian_bound, remove_dominated
+
+
+def _instance(rng, n=6, n_formats=3):
+    values = rng.integers(-20, 100, (n, n_formats)).astype(float)
+    costs = rng.integers(1, 30, (n, n_formats)).astype(float)
+    eligible = values > 0
+    budget = float(rng.integers(10, 80))
+    return values, costs, eligible, budget
+
+
+def _enumerate(values, costs, eligible, budget, max_shops):
+    # every choice of at most one eligible format per location
+    n, n_formats = values.shape
+    best = 0.0
+    for choice in itertools.product(range(-1, n_formats), repeat=n):
+        rows = [i for i, f in enumerate(choice) if f >= 0]
+        if any(not eligible[i, choice[i]] for i in rows):
+            continue
+        if max_shops is not None and len(rows) > max_shops:
+            continue
+        if sum(costs[i, choice[i]] for i in rows) > budget:
+            continue
+        best = max(best, sum(values[i, choice[i]] for i in rows))
+    return best
+
+
+def _check_feasible(choice, values, costs, eligible, budget, max_shops):
+    rows = np.flatnonzero(choice >= 0)
+    assert eligible[rows, choice[rows]].all()
+    assert costs[rows, choice[rows]].sum() <= budget + 1e-9
+    assert max_shops is None or len(rows) <= max_shops
+    return values[rows, choice[rows]].sum()
+
+
+def test_bound_greedy_and_dp_against_enumeration():
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        values, costs, eligible, budget = _instance(rng)
+        for max_shops in (None, 2):
+            best = _enumerate(values, costs, eligible, budget, max_shops)
+
+            bound, multipliers = lagrangian_bound(values, costs, eligible, budget, max_shops)
+            assert bound >= best - 1e-6
+
+            greedy = greedy_selection(values, costs, eligible, budget, max_shops, multipliers)
+            assert _check_feasible(greedy, values, costs, eligible, budget, max_shops) <= best + 1e-9
+
+            # costs are whole units, so the DP is exact
+            dp = dp_selection(values, costs, eligible, budget, max_shops, budget_unit=1.0)
+            np.testing.assert_allclose(_check_feasible(dp, values, costs, eligible, budget, max_shops), best)
+
+
+def test_removing_dominated_options_keeps_the_optimum():
+    rng = np.random.default_rng(1)
+    for _ in range(40):
+        values, costs, eligible, budget = _instance(rng)
+        kept = remove_dominated(values, costs, eligible)
+        assert (kept <= eligible).all()
+        for max_shops in (None, 2):
+            assert _enumerate(values, costs, kept, budget, max_shops) == \
+                _enumerate(values, costs, eligible, budget, max_shops)
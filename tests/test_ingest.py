@@ -0,0 +1,72 @@
+import pandas as pd
+
+from data_sources import PEDESTRIAN_FILE
+from ingest import ingest_counts
+from traffic import count_columns
+
+
+def _raw_rows():
+    with open(PEDESTRIAN_FILE, 'rb') as f:
+        return f.read().rstrip(b'\r\n')
+
+
+def _split_last(text):
+    lines = text.split(b'\n')
+    return b'\n'.join(lines[:-1]) + b'\n', lines[-1], len(lines)
+
+
+def test_last_row_without_newline_is_ingested(tmp_path):
+    path = tmp_path / 'counts.csv'
+    path.write_bytes(_raw_rows())
+
+    aggregator, rows = ingest_counts(str(path), state_dir=str(tmp_path / 'state'), final=True)
+    expected = pd.read_csv(PEDESTRIAN_FILE)
+    assert rows == len(expected)
+    assert sorted(aggregator.keys) == sorted(expected['Loc'].unique().tolist())
+
+
+def test_last_row_without_newline_is_ingested_once_the_size_settles(tmp_path):
+    path = tmp_path / 'counts.csv'
+    path.write_bytes(_raw_rows())
+    expected = pd.read_csv(PEDESTRIAN_FILE)
+
+    state = str(tmp_path / 'state')
+    _, rows = ingest_counts(str(path), state_dir=state)
+    assert rows == len(expected) - 1
+    aggregator, rows = ingest_counts(str(path), state_dir=state)
+    assert rows == 1
+    assert len(aggregator.keys) == len(expected)
+
+
+def test_partial_last_row_waits_for_the_rest(tmp_path):
+    path = tmp_path / 'counts.csv'
+    head, last, n_lines = _split_last(_raw_rows())
+    cut = last.index(b',', len(last) // 2)
+    path.write_bytes(head + last[:cut])
+
+    state = str(tmp_path / 'state')
+    _, rows = ingest_counts(str(path), state_dir=state)
+    assert rows == n_lines - 2
+
+    path.write_bytes(head + last + b'\n')
+    aggregator, rows = ingest_counts(str(path), state_dir=state)
+    assert rows == 1
+    assert len(aggregator.keys) == n_lines - 1
+
+
+def test_last_row_cut_inside_its_last_field_waits_for_the_rest(tmp_path):
+    path = tmp_path / 'counts.csv'
+    head, last, n_lines = _split_last(_raw_rows())
+    path.write_bytes(head + last[:-2])
+
+    state = str(tmp_path / 'state')
+    _, rows = ingest_counts(str(path), state_dir=state)
+    assert rows == n_lines - 2
+
+    path.write_bytes(head + last)
+    aggregator, rows = ingest_counts(str(path), state_dir=state, final=True)
+    assert rows == 1
+    assert len(aggregator.keys) == n_lines - 1
+    expected = pd.read_csv(PEDESTRIAN_FILE)
+    row = aggregator.rows[expected['Loc'].iloc[-1]]
+    assert aggregator.sums[row].sum() == expected.iloc[-1][list(count_columns(expected.columns))].sum()
@@ -0,0 +1,49 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from optimization import PERIODS, model_params, solve_numpy
+
+
+def _frame(n, seed, day='May07'):
+    rng = np.random.default_rng(seed)
+    data = {f'{day}_{t}': rng.integers(100, 8_000, n).astype(float) for t in PERIODS}
+    data['rent_per_sqft_daily'] = rng.uniform(1, 12, n)
+    return pd.DataFrame(data, index=pd.Index(np.arange(1, n + 1), name='Loc'))
+
+
+def _brute_force(candidate_locs, day, params):
+    # every on/off combination of the periods, kept when it runs at least 2
+    is_open, operating = [], []
+    conversion = [params['conversion_rates'][t] for t in PERIODS]
+    shop_size = params['shop_size']
+    for _, row in candidate_locs.iterrows():
+        best, best_periods = -np.inf, None
+        for periods in itertools.product([False, True], repeat=len(PERIODS)):
+            if sum(periods) < 2:
+                continue
+            profit = -row['rent_per_sqft_daily'] * shop_size
+            for on, t, c in zip(periods, PERIODS, conversion):
+                if on:
+                    profit += (row[f'{day}_{t}'] * c * params['profit_per_customer']
+                               - params['electricity_cost'] * shop_size - params['staff_cost_per_shift'])
+            if profit > best:
+                best, best_periods = profit, periods
+        opened = best >= params['min_daily_profit']
+        is_open.append(opened)
+        operating.append([opened and on for on in best_periods])
+    return np.array(is_open), np.array(operating, dtype=bool)
+
+
+def test_solve_numpy_matches_brute_force():
+    for seed, params in enumerate([model_params(),
+                                   model_params(shop_size=600, staff_wage=35),
+                                   model_params(conversion_rates={'AM': 0.02, 'MD': 0.1, 'PM': 0.05}),
+                                   model_params(min_daily_profit=2_000)]):
+        candidate_locs = _frame(40, seed)
+        is_open, operating = solve_numpy(candidate_locs, 'May07', params)
+        expected_open, expected_operating = _brute_force(candidate_locs, 'May07', params)
+        np.testing.assert_array_equal(is_open, expected_open)
+        np.testing.assert_array_equal(operating, expected_operating)
+        assert 0 < is_open.sum() < len(is_open)
@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+
+from benchmark import synthetic_zones_text
+from data_sources import NEIGHBORHOODS_FILE, parse_neighborhoods
+from rent_zones import BoxZoneIndex
+
+
+def _linear_rents(neighborhoods, lat, lon):
+    # the original per-row loop: first zone in listed order containing the point
+    rents = []
+    for y, x in zip(lat, lon):
+        for data in neighborhoods.values():
+            if data['lat_min'] <= y <= data['lat_max'] and data['lon_min'] <= x <= data['lon_max']:
+                rents.append(data['rent'])
+                break
+        else:
+            rents.append(np.nan)
+    return np.array(rents, dtype=float)
+
+
+def _random_points(neighborhoods, n, seed):
+    # rounded like the parsed coordinates, so many points land on zone edges
+    rng = np.random.default_rng(seed)
+    zones = list(neighborhoods.values())
+    lat_lo = min(z['lat_min'] for z in zones) - 0.01
+    lat_hi = max(z['lat_max'] for z in zones) + 0.01
+    lon_lo = min(z['lon_min'] for z in zones) - 0.01
+    lon_hi = max(z['lon_max'] for z in zones) + 0.01
+    return rng.uniform(lat_lo, lat_hi, n).round(3), rng.uniform(lon_lo, lon_hi, n).round(3)
+
+
+def test_grid_index_matches_the_linear_loop_on_the_real_zones():
+    with open(NEIGHBORHOODS_FILE) as f:
+        neighborhoods = parse_neighborhoods(f.read())
+    lat, lon = _random_points(neighborhoods, 5_000, seed=0)
+    np.testing.assert_array_equal(BoxZoneIndex(neighborhoods).rents(lat, lon),
+                                  _linear_rents(neighborhoods, lat, lon))
+
+
+def test_grid_index_matches_the_linear_loop_on_synthetic_zones():
+    for seed in range(3):
+        neighborhoods = json.loads(synthetic_zones_text(200, seed))
+        lat, lon = _random_points(neighborhoods, 3_000, seed)
+        index = BoxZoneIndex(neighborhoods, cell_size=0.02, chunk_size=1_000)
+        np.testing.assert_array_equal(index.rents(lat, lon), _linear_rents(neighborhoods, lat, lon))
@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+
+from data_sources import NEIGHBORHOODS_FILE, NEIGHBORHOODS_URL, PEDESTRIAN_URL, parse_neighborhoods
+from optimization import prepare_data
+from scoring import ScoringService, SiteScorer
+from traffic import traffic_cube
+
+
+def _scorer(**kwargs):
+    df = prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=True, use_store=False)
+    with open(NEIGHBORHOODS_FILE) as f:
+        neighborhoods = parse_neighborhoods(f.read())
+    return df, SiteScorer(df, neighborhoods, **kwargs)
+
+
+def test_traffic_comes_from_every_counted_site_with_or_without_rent():
+    df, scorer = _scorer()
+    cube = traffic_cube(df)
+    counted = ~np.isnan(cube.survey('May07')).any(axis=1)
+    assert len(scorer.locations) == counted.sum()
+    assert np.isnan(cube.static['rent_per_sqft'][counted]).any()
+
+
+def test_points_beyond_max_distance_are_rejected():
+    _, scorer = _scorer(k=3, max_distance=2000)
+    service = ScoringService(scorer)
+    status, payload = service.route('GET', '/score?lat=10&lon=10', b'')
+    assert status == 400 and 'error' in payload
+
+    body = json.dumps({'lat': [40.75, 10], 'lon': [-73.98, 10]}).encode()
+    status, payload = service.route('POST', '/score/batch', body)
+    near, far = payload['results']
+    assert status == 200
+    assert near['daily_profit'] is not None and 'error' not in near
+    assert far['traffic'] is None and far['daily_profit'] is None and not far['viable']
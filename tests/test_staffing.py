@@ -0,0 +1,51 @@
+import itertools
+
+import numpy as np
+
+from staffing import _schedule_dp
+
+
+def _runs_ok(levels, min_shift):
+    # every stretch at one staff level lasts at least min_shift hours
+    return all(len(list(run)) >= min_shift for _, run in itertools.groupby(levels))
+
+
+def _exhaustive(profit, rent_cost, min_shift):
+    # best schedule of one location: one open block, each level held min_shift hours
+    n_hours, n_levels = profit.shape
+    best = 0.0
+    for start in range(n_hours):
+        for stop in range(start + 1, n_hours + 1):
+            for levels in itertools.product(range(n_levels), repeat=stop - start):
+                if _runs_ok(levels, min_shift):
+                    value = profit[np.arange(start, stop), levels].sum() - rent_cost
+                    best = max(best, value)
+    return best
+
+
+def _schedule_value(profit, rent_cost, schedule):
+    hours = np.flatnonzero(schedule >= 0)
+    if not len(hours):
+        return 0.0
+    return profit[hours, schedule[hours]].sum() - rent_cost
+
+
+def test_dp_matches_exhaustive_search():
+    rng = np.random.default_rng(0)
+    for min_shift in (1, 2, 3):
+        for n_levels in (1, 2, 3):
+            profit = rng.normal(5, 20, (25, 6, n_levels))
+            rent_cost = rng.uniform(0, 40, 25)
+            value, schedule = _schedule_dp(profit, rent_cost, min_shift)
+            for i in range(len(profit)):
+                expected = _exhaustive(profit[i], rent_cost[i], min_shift)
+                np.testing.assert_allclose(value[i], expected, atol=1e-9)
+
+                # the schedule walked back is feasible and earns the DP value
+                is_open = schedule[i] >= 0
+                open_hours = np.flatnonzero(is_open)
+                if len(open_hours):
+                    assert is_open[open_hours[0]:open_hours[-1] + 1].all()
+                    assert _runs_ok(schedule[i][is_open].tolist(), min_shift)
+                np.testing.assert_allclose(_schedule_value(profit[i], rent_cost[i], schedule[i]),
+                                           value[i], atol=1e-9)
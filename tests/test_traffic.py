@@ -0,0 +1,37 @@
+import pandas as pd
+
+from data_sources import NEIGHBORHOODS_URL, PEDESTRIAN_URL
+from optimization import optimize_coffee_shops, prepare_data, select_candidates
+from traffic import traffic_cube
+
+
+def _prepared():
+    return prepare_data(PEDESTRIAN_URL, NEIGHBORHOODS_URL, offline=True, use_store=False)
+
+
+def _edit(df):
+    df['rent_per_sqft_daily'] *= 2
+    df.loc[:, 'May07_AM'] = 0
+
+
+def test_cube_follows_in_place_edits():
+    df = _prepared()
+    before = optimize_coffee_shops(df, backend='numpy')
+    edited = df.copy()
+    _edit(edited)
+    _edit(df)
+
+    after = optimize_coffee_shops(df, backend='numpy')
+    pd.testing.assert_frame_equal(after, optimize_coffee_shops(edited, backend='numpy'))
+    assert len(after) < len(before)
+    assert (select_candidates(df)['May07_AM'] == 0).all()
+
+
+def test_cube_is_reused_until_the_frame_changes():
+    df = _prepared()
+    cube = traffic_cube(df)
+    assert traffic_cube(df) is cube
+    assert traffic_cube(df.copy(deep=False)) is cube
+    assert traffic_cube(df[df['Borough'] == 'Manhattan']) is not cube
+    df.loc[df.index[0], 'rent_per_sqft_daily'] += 1
+    assert traffic_cube(df) is not cube
@@ -0,0 +1,39 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from zone_coverage import ambiguous_sites, overlapping_pairs
+
+
+def _grid_boxes(n, seed):
+    # corners on a coarse grid, so many boxes share an edge or a corner
+    rng = np.random.default_rng(seed)
+    lat = np.sort(rng.integers(0, 12, (n, 2)) / 100, axis=1)
+    lon = np.sort(rng.integers(0, 12, (n, 2)) / 100, axis=1)
+    return np.column_stack([lat, lon])
+
+
+def test_sweep_finds_every_overlapping_or_touching_pair():
+    for seed in range(5):
+        bounds = _grid_boxes(60, seed)
+        expected = [(i, j) for i, j in itertools.combinations(range(len(bounds)), 2)
+                    if bounds[i, 0] <= bounds[j, 1] and bounds[j, 0] <= bounds[i, 1]
+                    and bounds[i, 2] <= bounds[j, 3] and bounds[j, 2] <= bounds[i, 3]]
+        assert overlapping_pairs(bounds).tolist() == [list(p) for p in expected]
+
+
+def test_site_on_a_shared_edge_is_ambiguous():
+    neighborhoods = {
+        'West': {'lat_min': 40.70, 'lat_max': 40.80, 'lon_min': -74.00, 'lon_max': -73.95, 'rent': 120.0},
+        'East': {'lat_min': 40.70, 'lat_max': 40.80, 'lon_min': -73.95, 'lon_max': -73.90, 'rent': 90.0},
+    }
+    df = pd.DataFrame({'Loc': [1, 2, 3], 'latitude': [40.75, 40.75, 40.75],
+                       'longitude': [-73.97, -73.95, -73.92]})
+    assert overlapping_pairs(np.array([[40.70, 40.80, -74.00, -73.95],
+                                       [40.70, 40.80, -73.95, -73.90]])).tolist() == [[0, 1]]
+
+    ambiguous = ambiguous_sites(df, neighborhoods)
+    assert ambiguous['Loc'].tolist() == [2]
+    assert ambiguous['Zones'].tolist() == ['West, East']
+    assert ambiguous['Resolved To'].tolist() == ['West']